@@ -3,17 +3,42 @@
 #
 
 #from __future__ import division
+import functools
+import importlib
 import logging
+import threading
 import time
-from PIL import Image, ImageDraw, ImageFont
+from collections import OrderedDict
 
+# PIL, NumPy, asyncio and the I2C/SPI/GPIO modules are all imported when
+# first needed, so that importing this module (and starting up a program
+# that only sends raw bytes) is quick.
+numpy = None            # NumPy if it is installed, once _load_numpy() has run
+_numpy_tried = False
 
-import I2C
-import SPI
-import GPIO
+def _load_numpy():
+    global numpy, _numpy_tried
+    _numpy_tried = True
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+_LAZY_MODULES = {
+    'I2C': 'I2C', 'SPI': 'SPI', 'GPIO': 'GPIO',
+    'Image': 'PIL.Image', 'ImageDraw': 'PIL.ImageDraw', 'ImageFont': 'PIL.ImageFont',
+}
+
+def __getattr__(name):
+    # So that fast_ssd1305.SPI, fast_ssd1305.GPIO etc. still work.
+    if name in _LAZY_MODULES:
+        return importlib.import_module(_LAZY_MODULES[name])
+    raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
 
 # Constants
 SSD1305_I2C_ADDRESS = 0x3C    # 011110+SA0+RW - 0x3C or 0x3D
+_GPIO_OUT = 0                 # GPIO.OUT, so the GPIO module is only needed for platform GPIO
+SSD1305_COLUMNS = 132         # Columns of GDDRAM, the panel shows the last 128 of them when reversed
 
 # SSD1305 commands, from datasheet
 SSD1305_SETLOWCOLUMN = 0x00        # Set Low Nibble of col start addres register. [3:0]
@@ -26,7 +51,7 @@ SSD1305_SETCONTRAST = 0x81         # Set contrast. Next byte 0-255. Basically Br
 SSD1305_SETAREABRIGHTNESS = 0x82   # Set brighntess for area colour banks. Next byte 0-255
 SSD1305_SETLUT = 0x91              # Set current drive pulse width of Bank0, colours A,B,C, 31-63
                                    # Bytes: Bank0, Colour A, B, C. Not tested.
-SSD1305_SETBANKCOLOURPAGE0 = 0x9   # Set Bank colours of Bank1-16 (page 0). Each Bank can be 0,1,2,3 (colour A,B,C,D)
+SSD1305_SETBANKCOLOURPAGE0 = 0x92  # Set Bank colours of Bank1-16 (page 0). Each Bank can be 0,1,2,3 (colour A,B,C,D)
                                    # Byte 1: Bank4[7:6]  Bank3[5:4]  Bank2[3:2]  Bank1[1:0]
                                    # Byte 2: Bank8[7:6]  Bank7[5:4]  Bank6[3:2]  Bank5[1:0]
                                    # Byte 3: Bank12[7:6] Bank11[5:4] Bank10[3:2] Bank9[1:0]
@@ -84,6 +109,157 @@ SSD1305_SET_VERTICAL_SCROLL_AREA = 0xA3             # Vertical Scroll Setup
                                                     # Byte 2: Number of Rows to be scrolled.
 
 
+# Packing engine. Turns 1-bit pixels into SSD1305 page bytes.
+# Output is page-major: for each page, one byte per column in column address
+# order. Column address 0 is the rightmost image column (see image()), and the
+# top pixel of each page lives in bit 0.
+def pack_rows(data, width, height, pages):
+    """Pack raw 1-bit rows (PIL mode '1' layout, MSB first, rows padded to a
+    whole byte) into a bytearray of page bytes."""
+    data = memoryview(data).cast('B')
+    stride = (width + 7) // 8
+    rows = pages * 8
+    if height < rows or len(data) < stride * rows:
+        raise ValueError('Need at least {0} rows of pixel data.'.format(rows))
+    if not _numpy_tried:
+        _load_numpy()
+    if numpy is not None:
+        bits = numpy.frombuffer(data, dtype=numpy.uint8, count=stride * rows)
+        bits = numpy.unpackbits(bits.reshape(rows, stride), axis=1)[:, width - 1::-1]
+        # Top row last, so it lands in bit 0. (packbits has no bitorder
+        # before NumPy 1.17, and Raspbian Buster ships 1.16.)
+        return bytearray(numpy.packbits(bits.reshape(pages, 8, width)[:, ::-1, :], axis=1))
+    return _pack_bytes(data, width, pages)
+
+def pack_image(image, pages):
+    """Pack the top pages*8 rows of a mode '1' PIL image into page bytes."""
+    width, height = image.size
+    return pack_rows(image.tobytes(), width, height, pages)
+
+def _diff_spans(new, old, gap):
+    # Return (start, end) spans of columns where new and old differ. Spans
+    # separated by no more than gap unchanged columns are merged, as sending
+    # those is cheaper than setting up another window.
+    if not _numpy_tried:
+        _load_numpy()
+    if numpy is not None:
+        changed = numpy.flatnonzero(numpy.frombuffer(new, dtype=numpy.uint8)
+                                    != numpy.frombuffer(old, dtype=numpy.uint8))
+        if not len(changed):
+            return []
+        breaks = numpy.flatnonzero(numpy.diff(changed) > gap + 1)
+        starts = changed[numpy.concatenate(([0], breaks + 1))]
+        ends = changed[numpy.concatenate((breaks, [len(changed) - 1]))]
+        return list(zip(starts.tolist(), ends.tolist()))
+    spans = []
+    for i, (a, b) in enumerate(zip(new, old)):
+        if a != b:
+            if spans and i - spans[-1][1] - 1 <= gap:
+                spans[-1][1] = i
+            else:
+                spans.append([i, i])
+    return [tuple(span) for span in spans]
+
+_spread = None
+
+def _pack_bytes(data, width, pages):
+    # Pure Python fallback, working straight from the rows. Bit k of each
+    # row byte is looked up in a table that moves it to bit r (the row within
+    # the page) of its own byte, so translating row r of a page with table
+    # [k][r] gives every 8th column's contribution from that row. The rows of
+    # a page are ORed together as big integers.
+    global _spread
+    if _spread is None:
+        _spread = [[bytes(((v >> (7 - k)) & 1) << r for v in range(256)) for r in range(8)]
+                   for k in range(8)]
+    stride = (width + 7) // 8
+    buf = bytearray(width * pages)
+    columns = bytearray(stride * 8)
+    for p in range(pages):
+        rows = [bytes(data[(p * 8 + r) * stride:(p * 8 + r + 1) * stride]) for r in range(8)]
+        for k in range(8):
+            bits = 0
+            for r in range(8):
+                bits |= int.from_bytes(rows[r].translate(_spread[k][r]), 'little')
+            columns[k::8] = bits.to_bytes(stride, 'little')
+        # Column address order runs right to left.
+        buf[p * width:(p + 1) * width] = columns[width - 1::-1]
+    return buf
+
+
+# 8x8 ordered dither matrix, built up from the 2x2 one.
+_BAYER = [[0]]
+for _ in range(3):
+    _BAYER = ([[4 * v for v in row] + [4 * v + 2 for v in row] for row in _BAYER] +
+              [[4 * v + 3 for v in row] + [4 * v + 1 for v in row] for row in _BAYER])
+
+
+# Text. Fonts are loaded once, and each glyph is rendered once into column
+# bytes, so drawing a line of text is just joining byte strings together.
+_FONTS = {
+    8: ('pressstart2p.ttf', 1),          # Font size: (font file, pages tall)
+    16: ('perfect_dos_vga_437.ttf', 2),
+}
+_atlases = {}
+
+class GlyphAtlas(object):
+    """Cache of glyphs pre-rendered into page bytes, one bytes object per
+    page holding the glyph's columns left to right. At most max_glyphs are
+    kept, least recently used go first."""
+
+    def __init__(self, font, pages, max_glyphs=256):
+        self.font = font
+        self.pages = pages
+        self.max_glyphs = max_glyphs
+        self._glyphs = OrderedDict()
+
+    def glyph(self, char):
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            glyph = self._render(char)
+            self._glyphs[char] = glyph
+            if len(self._glyphs) > self.max_glyphs:
+                self._glyphs.popitem(last=False)
+        else:
+            self._glyphs.move_to_end(char)
+        return glyph
+
+    def _render(self, char):
+        if hasattr(self.font, 'getlength'):
+            advance = int(round(self.font.getlength(char)))
+        else:
+            advance = self.font.getsize(char)[0]
+        if advance <= 0:
+            return (b'',) * self.pages
+        from PIL import Image, ImageDraw
+        image = Image.new('1', (advance, self.pages * 8))
+        ImageDraw.Draw(image).text((0, 0), char, font=self.font, fill=255)
+        packed = pack_image(image, self.pages)
+        # pack_image gives display column order, which runs right to left.
+        return tuple(bytes(packed[p * advance:(p + 1) * advance][::-1]) for p in range(self.pages))
+
+    def render(self, text, width, indent=0):
+        """Render a line of text into a list of page bytearrays, each width
+        long in display column order."""
+        glyphs = [self.glyph(char) for char in text]
+        lines = []
+        for p in range(self.pages):
+            line = bytearray(indent) + b''.join(glyph[p] for glyph in glyphs)
+            line = line[:width] + bytearray(width - len(line))
+            lines.append(line)
+        return lines
+
+def _atlas(size):
+    # Shared atlas for one of the built in font sizes.
+    atlas = _atlases.get(size)
+    if atlas is None:
+        if size not in _FONTS:
+            raise ValueError('Font size must be 8 or 16')
+        filename, pages = _FONTS[size]
+        from PIL import ImageFont
+        atlas = _atlases[size] = GlyphAtlas(ImageFont.truetype(filename, size), pages)
+    return atlas
+
 class fast_ssd1305Base(object):
     """Base class for SSD1305-based OLED displays.  Implementors should subclass
     and provide an implementation for the _initialize function.
@@ -91,30 +267,40 @@ class fast_ssd1305Base(object):
 
     def __init__(self, width, height, rst, dc=None, sclk=None, din=None, cs=None,
                  gpio=None, spi=None, i2c_bus=None, i2c_address=SSD1305_I2C_ADDRESS,
-                 i2c=None):
+                 i2c=None, i2c_chunk_size=32):
         self._log = logging.getLogger('fast_1305.SSD1305Base')
         self._spi = None
         self._i2c = None
+        self._i2c_chunk_size = i2c_chunk_size # Largest block write the I2C adapter allows (32 for SMBus)
         self.width = width            # Width or number of columns. Typically 128.
         self.height = height          # Height, should be a multiple of 8, as pages are 8 pix high.  Typically 32 or 64.
         self._pages = int(height / 8) # Calculare number of visible pages
-        print (str(self._pages))
-        self._buffer = [0]*(width*self._pages) # Buffer to store entire display before writing.
-        self._pagebuffer = [0]*(width)         # Buffer to store a page before writing
+        self._buffer = bytearray(width * 8)    # Shadow copy of GDDRAM, all 8 pages, page-major
+        self._page_valid = [False] * 8         # Which shadow pages are known to match GDDRAM
+        self._window_cost = 6                  # Command bytes needed to set up a new window
+        self._dc_level = None                  # Last level written to the DC pin, None if unknown
+        self._remap = SSD1305_SETHORIZONTALNORMAL  # Segment remap for the orientation, see set_orientation()
+        self._com_scan = SSD1305_COMSCANDEC
+        self._col_shift = 0                    # Added to column addresses when the segment remap is reversed
+        self._forget_addressing()
+        self._writer = None                    # Background writer thread, see start_writer()
+        self._executor = None                  # Worker thread for the asyncio functions
+        self._stats = None                     # Instrumentation, see enable_stats()
+        self.set_dither()
+        self.frames_coalesced = 0              # Submissions merged into one still waiting to be sent
         self._page = 0                         # Keep track of which page we are writing text when scrolling
         self._vert_offset = 0                  # Keep track of offset, used for manual vertical scrolling
         self._text_line = 0                    # Keep track of how many lines of text we have displayed for text scrolling
-        self._pageimage = Image.new('1', (width,8)) # PIL image for page
-        self._pagedraw = ImageDraw.Draw(self._pageimage) # PIL drawing canvas for page.
         # Next bits pinched from Adafruit Library
         # Default to platform GPIO if not provided.
         self._gpio = gpio
         if self._gpio is None:
+            import GPIO
             self._gpio = GPIO.get_platform_gpio()
         # Setup reset pin.
         self._rst = rst
         if not self._rst is None:
-            self._gpio.setup(self._rst, GPIO.OUT)
+            self._gpio.setup(self._rst, _GPIO_OUT)
         # Handle hardware SPI
         if spi is not None:
             self._log.debug('Using hardware SPI')
@@ -123,6 +309,7 @@ class fast_ssd1305Base(object):
         # Handle software SPI
         elif sclk is not None and din is not None and cs is not None:
             self._log.debug('Using software SPI')
+            import SPI
             self._spi = SPI.BitBang(self._gpio, sclk, din, None, cs)
         # Handle hardware I2C
         elif i2c is not None:
@@ -140,58 +327,77 @@ class fast_ssd1305Base(object):
             if dc is None:
                 raise ValueError('DC pin must be provided when using SPI.')
             self._dc = dc
-            self._gpio.setup(self._dc, GPIO.OUT)
+            self._gpio.setup(self._dc, _GPIO_OUT)
 
     def _initialize(self):
         raise NotImplementedError
 
+    def _set_dc(self, level):
+        # Only touch the DC pin when it actually needs to change.
+        if self._dc_level != level:
+            if level:
+                self._gpio.set_high(self._dc)
+            else:
+                self._gpio.set_low(self._dc)
+            self._dc_level = level
+
     def command(self,c):
         """Send self.command byte to display."""
+        self.commands((c,))
+
+    def commands(self, seq):
+        """Send a sequence of command bytes to display in one transfer."""
         if self._spi is not None:
             # SPI write.
-            self._gpio.set_low(self._dc)
-            self._spi.write([c])
+            self._set_dc(0)
+            self._spi.write(list(seq))
         else:
-            # I2C write.
-            control = 0x00   # Co = 0, DC = 0
-            self._i2c.write8(control, c)
+            # I2C write. One stream of commands, no Co bit.
+            self._i2c_write(0x00, list(seq))   # Co = 0, DC = 0
 
     def data_byte(self, c):
         """Send single byte of data to display."""
-        if self._spi is not None:
-            # SPI write.
-            self._gpio.set_high(self._dc)
-            self._spi.write([c])
-        else:
-            # I2C write.
-            control = 0x40   # Co = 0, DC = 0
-            self._i2c.write8(control, c)
+        self.data((c,))
 
     def data(self, buf):
         """Send array of data to display."""
+        if self._window is not None:
+            self._window_pos = (self._window_pos + len(buf)) % self._window_size
         if self._spi is not None:
             # SPI write.
-            self._gpio.set_high(self._dc)
+            self._set_dc(1)
             self._spi.write(buf)
         else:
-            # I2C write. TODO: This hasn't been tested at all!!
-            control = 0x40   # Co = 0, DC = 0
-            for c in buf:
-                self._i2c.write8(control, c)
+            # I2C write.
+            self._i2c_write(0x40, buf)   # Co = 0, DC = 1
 
-    def begin(self):
-        """Initialize display."""
+    def _i2c_write(self, control, buf):
+        # Send buf as block writes, each starting with the control byte.
+        size = self._i2c_chunk_size
+        for i in range(0, len(buf), size):
+            self._i2c.writeList(control, list(buf[i:i + size]))
+
+    def begin(self, reinit=True):
+        """Initialize display. The whole init sequence, which also turns
+        the display on, goes in one transfer. With reinit=False a panel that
+        is already set up (by an earlier run, say) is not reset or
+        initialized again, only the driver's idea of it is started afresh."""
+        self.invalidate()
+        self._forget_addressing()
+        if not reinit:
+            return
         # Reset and initialize display.
         self.reset()
         self._initialize()
-        # Turn on the display.
-        self.all_on(False)
-        self.on
+        if self._com_scan != SSD1305_COMSCANDEC:
+            self.command(self._com_scan)
 
     def reset(self):
         """Reset the display."""
         if self._rst is None:
             return
+        self.invalidate()
+        self._forget_addressing()
         # Set reset high for a millisecond.
         self._gpio.set_high(self._rst)
         time.sleep(0.001)
@@ -226,162 +432,614 @@ class fast_ssd1305Base(object):
         else :
             self.command(SSD1305_NORMALDISPLAY)
 
+    def _forget_addressing(self):
+        # Addressing mode, window and segment remap as last sent to the
+        # display. None means unknown, so the next window sends everything.
+        self._addressing = None
+        self._segment_remap = None
+        self._window = None     # (col_start, col_end, page_start, page_end)
+        self._window_size = 0
+        self._window_pos = 0    # Bytes written into the window, mod its size
+
+    def _set_window(self, col_start, col_end, page_start, page_end):
+        # Horizontal addressing: data fills each page of the window left to
+        # right, which is the page-major layout produced by pack_image().
+        # Anything the display already has set up is not sent again. Once a
+        # window has been filled the address pointer is back at its start, so
+        # writing the same window again needs no commands at all.
+        cmds = []
+        if self._addressing != 0x00:
+            cmds += [SSD1305_MEMORYMODE, 0x00]   # Horizontal Mode
+            self._addressing = 0x00
+        window = (col_start, col_end, page_start, page_end)
+        rewind = self._window is None or self._window_pos != 0
+        if rewind or self._window[:2] != window[:2]:
+            cmds += [SSD1305_COLUMNADDR, col_start + self._col_shift, col_end + self._col_shift]
+        if rewind or self._window[2:] != window[2:]:
+            cmds += [SSD1305_PAGEADDR, page_start, page_end]
+        self._window = window
+        self._window_size = (col_end + 1 - col_start) * (page_end + 1 - page_start)
+        self._window_pos = 0
+        if self._segment_remap != self._remap:
+            cmds.append(self._remap)
+            self._segment_remap = self._remap
+        if cmds:
+            self.commands(cmds)
+
+    def set_orientation(self, rotation=0, mirror_horizontal=False, mirror_vertical=False):
+        """Turn the picture round 0 or 180 degrees, and/or mirror it left to
+        right or top to bottom. The controller does this as the data is
+        written and scanned out, so images are drawn as they are, with no
+        rotated copies. Hardware scrolling directions follow the panel, not
+        the picture."""
+        if rotation not in (0, 180):
+            raise ValueError('Rotation must be 0 or 180')
+        flip = rotation == 180
+        if mirror_horizontal != flip:
+            # Reversed, column address c lands on the panel at c - 4, so shift
+            # every window along to line the picture back up.
+            self._remap = SSD1305_SETHORIZONTALREVERSE
+            self._col_shift = SSD1305_COLUMNS - self.width
+        else:
+            self._remap = SSD1305_SETHORIZONTALNORMAL
+            self._col_shift = 0
+        self._com_scan = SSD1305_COMSCANINC if mirror_vertical != flip else SSD1305_COMSCANDEC
+        self.command(self._com_scan)
+        # The segment remap only applies to data written after it, so write
+        # everything known to be on the display again.
+        self._forget_addressing()
+        valid = self._page_valid
+        self.invalidate()
+        for page in range(8):
+            if valid[page]:
+                self._update(bytes(self._buffer[page * self.width:(page + 1) * self.width]),
+                             0, self.width - 1, page, page)
+
+    def invalidate(self, page=None):
+        """Forget the shadow copy of GDDRAM (or just one page of it), so the
+        next write to it is sent in full."""
+        if page is None:
+            self._page_valid = [False] * 8
+        else:
+            self._page_valid[page % 8] = False
+
+    def _update(self, buf, col_start, col_end, page_start, page_end):
+        # Write page-major buf to the given window, sending only the columns
+        # that differ from the shadow copy in self._buffer. What gets sent is
+        # sliced straight out of buf where possible, without copying it.
+        buf = memoryview(buf)
+        width = col_end + 1 - col_start
+        spans = []
+        for i, page in enumerate(range(page_start, page_end + 1)):
+            new = buf[i * width:(i + 1) * width]
+            offset = page * self.width + col_start
+            if self._page_valid[page]:
+                old = self._buffer[offset:offset + width]
+                if new == old:
+                    continue
+                for start, end in _diff_spans(new, old, self._window_cost):
+                    spans.append((page, col_start + start, col_start + end))
+            else:
+                spans.append((page, col_start, col_end))
+            self._buffer[offset:offset + width] = new
+            self._page_valid[page] = True
+        if not spans:
+            return
+        # Either send one window covering every change, or one per span,
+        # whichever adds up to fewer bytes on the bus.
+        first, last = spans[0][0], spans[-1][0]
+        low = min(span[1] for span in spans)
+        high = max(span[2] for span in spans)
+        together = self._window_cost + (last + 1 - first) * (high + 1 - low)
+        apart = sum(self._window_cost + end + 1 - start for page, start, end in spans)
+        try:
+            if together <= apart:
+                self._set_window(low, high, first, last)
+                if (first, last, low, high) == (page_start, page_end, col_start, col_end):
+                    self.data(buf[:width * (last + 1 - first)])
+                else:
+                    self.data(b''.join(self._buffer[page * self.width + low:page * self.width + high + 1]
+                                       for page in range(first, last + 1)))
+            else:
+                for page, start, end in spans:
+                    self._set_window(start, end, page, page)
+                    i = (page - page_start) * width + start - col_start
+                    self.data(buf[i:i + end + 1 - start])
+        except Exception:
+            # The shadow copy already holds the new frame, but the display may
+            # not. Forget it and the window position, so a retry sends it all.
+            for page in range(first, last + 1):
+                self.invalidate(page)
+            self._forget_addressing()
+            raise
+
     def clear(self):
-        buf = [0] * (self.width) * 8
-
-        # Configure Display
-        self.command(SSD1305_MEMORYMODE)
-        self.command(0x01)                    # Vertical Mode
-        self.command(SSD1305_COLUMNADDR)
-        self.command(0x00)                    # start Column 0
-        self.command(0x7F)                    # end Column 127
-        self.command(SSD1305_PAGEADDR)
-        self.command(0x00)                    # start at page 0
-        self.command(0x00 + 7)              # end at last page
-        self.command(SSD1305_SETHORIZONTALNORMAL) # No L-R swap TODO: Needed??
-        self.data(buf)
+        # Always sent in full, so the display is in a known state afterwards.
+        self._buffer[:] = bytes(self.width * 8)
+        self._page_valid = [True] * 8
+        self._set_window(0, self.width - 1, 0, 7)
+        self.data(self._buffer)
 
     def image(self, image):
         # Write a 1-bit PIL image to display
-        # Works by Setting vertical adressing mode, and loading the image in sideways
-        # So far this is the fastest python-based method to load the whole display
-        if image.mode != '1':
-            raise ValueError('Image must be in mode 1.')
+        # The image is packed straight into page bytes (see pack_image), and
+        # only the parts that changed since the last write are sent.
+        self._update(*self._pack_frame(image))
+
+    def page(self, image,page):
+        # Write a 1-bit PIL image to page
+        self._update(*self._pack_page(image, page))
+
+    def window(self, image, page, start, end):
+        # Write a 1-bit PIL image to sub-section of a page
+        self._update(*self._pack_window(image, page, start, end))
+
+    def blit(self, image, x, y, size=None):
+        # Draw a 1-bit PIL image, any size, with its top left corner at x, y.
+        # Raw 1-bit rows (as pack_rows() takes) can be given instead, with
+        # size=(width, height). It is clipped to the display RAM (all 64
+        # rows). Pages the image only partly covers are merged with the
+        # shadow copy, so the pixels around it are left alone, and only
+        # columns that change are sent.
+        from PIL import Image
+        if size is not None:
+            stride = (size[0] + 7) // 8
+            image = Image.frombytes('1', size, bytes(memoryview(image).cast('B')[:stride * size[1]]))
+        else:
+            image = self._mono(image, x, y)
+        imwidth, imheight = image.size
+        left, top = max(x, 0), max(y, 0)
+        right, bottom = min(x + imwidth, self.width), min(y + imheight, 64)
+        if left >= right or top >= bottom:
+            return
+        if (left, top, right, bottom) != (x, y, x + imwidth, y + imheight):
+            image = image.crop((left - x, top - y, right - x, bottom - y))
+        width, height = right - left, bottom - top
+        first, last = top // 8, (bottom - 1) // 8
+        pages = last + 1 - first
+        shift = top % 8
+        # Line the image up with the pages it lands on, and pack that.
+        padded = Image.new('1', (width, pages * 8))
+        padded.paste(image, (0, shift))
+        buf = pack_image(padded, pages)
+        col_start = self.width - right
+        for i in range(pages):
+            low = max(shift - 8 * i, 0)
+            high = min(shift + height - 8 * i, 8)
+            mask = (0xFF >> (8 - high)) & (0xFF << low) & 0xFF
+            if mask != 0xFF:
+                # Keep the bits outside the image from the shadow copy. The
+                # whole row is done at once as one big integer.
+                offset = (first + i) * self.width + col_start
+                keep = int.from_bytes(bytes((~mask & 0xFF,)) * width, 'little')
+                old = int.from_bytes(self._buffer[offset:offset + width], 'little')
+                new = int.from_bytes(buf[i * width:(i + 1) * width], 'little')
+                buf[i * width:(i + 1) * width] = ((old & keep) | new).to_bytes(width, 'little')
+        self._update(buf, col_start, col_start + width - 1, first, last)
+
+    def raw_frame(self, buf):
+        # Write a whole frame that is already in page bytes: page-major, one
+        # byte per column in column address order, top pixel in bit 0, as
+        # made by pack_image() or pack_rows(). Any buffer will do (bytes,
+        # memoryview, a uint8 NumPy array...) and it is not copied.
+        self._update(self._raw(buf, self.width * self._pages), 0, self.width - 1, 0, self._pages - 1)
+
+    def raw_page(self, buf, page):
+        # Write one page that is already in page bytes, see raw_frame()
+        if page < 0 or page > 7:
+            raise ValueError('Page must be 0-7')
+        self._update(self._raw(buf, self.width), 0, self.width - 1, page, page)
+
+    def raw_window(self, buf, page, start, end):
+        # Write part of a page that is already in page bytes, see raw_frame().
+        # start and end are image columns, as for window(), so buf holds
+        # image column end first.
+        if start < 0 or start > 127:
+            raise ValueError('Window Start must be 0-127')
+        if end < 0 or end > 127 or start > end:
+            raise ValueError('Window End must be 0-127 and >= Start')
+        if page < 0 or page > 7:
+            raise ValueError('Page must be 0-7')
+        col_start = self.width - end - 1
+        self._update(self._raw(buf, end + 1 - start), col_start, col_start + end - start, page, page)
+
+    def _raw(self, buf, size):
+        view = memoryview(buf)
+        if not view.c_contiguous:
+            raise ValueError('Buffer must be contiguous.')
+        view = view.cast('B')
+        if len(view) != size:
+            raise ValueError('Buffer must be {0} bytes long.'.format(size))
+        return view
+
+    ### Conversion to 1 bit
+    # image(), page(), window() and blit() also take 'L', 'RGB' and any other
+    # image PIL can turn into 'L'. Both ways of converting are done by PIL in
+    # one pass over the image: a threshold is a lookup table, and the ordered
+    # dither subtracts a map of thresholds, tiled to the image size and made
+    # once per size, then lights whatever is left above zero.
+    def set_dither(self, method='bayer', threshold=128, cache_size=8):
+        """Choose how images that aren't mode '1' are converted: 'threshold'
+        lights pixels at least threshold bright, 'bayer' uses an 8x8 ordered
+        dither. The last cache_size conversions are kept, so sending the same
+        frame again costs nothing to convert."""
+        if method not in ('threshold', 'bayer'):
+            raise ValueError("Dither method must be 'threshold' or 'bayer'")
+        if threshold < 0 or threshold > 255:
+            raise ValueError('Threshold must be a value from 0 to 255 (inclusive).')
+        self._dither = method
+        self._threshold_table = [255 if v >= threshold else 0 for v in range(256)]
+        self._nonzero_table = [0] + [255] * 255
+        self._dither_maps = {}
+        self._conversions = OrderedDict()
+        self._conversion_cache_size = cache_size
+
+    def _mono(self, image, x=0, y=0):
+        # image in mode '1', converted if need be. x, y is where its top left
+        # corner goes on the display, so the dither pattern lines up across
+        # windows and blits.
+        if image.mode == '1':
+            return image
+        key = (image.mode, image.size, x % 8, y % 8, image.tobytes())
+        if image.mode in ('P', 'PA'):
+            # The same indices mean different colours under another palette.
+            key += (bytes(image.getpalette() or ()),)
+        mono = self._conversions.get(key)
+        if mono is not None:
+            self._conversions.move_to_end(key)
+            return mono
+        grey = image if image.mode == 'L' else image.convert('L')
+        if self._dither == 'bayer':
+            from PIL import ImageChops
+            grey = ImageChops.subtract(grey, self._dither_map(grey.size, x % 8, y % 8))
+            mono = grey.point(self._nonzero_table, '1')
+        else:
+            mono = grey.point(self._threshold_table, '1')
+        if self._conversion_cache_size:
+            self._conversions[key] = mono
+            if len(self._conversions) > self._conversion_cache_size:
+                self._conversions.popitem(last=False)
+        return mono
+
+    def _dither_map(self, size, x, y):
+        # 'L' image of Bayer thresholds (2-254), starting x columns and y rows
+        # into the 8x8 matrix.
+        dither_map = self._dither_maps.get((size, x, y))
+        if dither_map is None:
+            from PIL import Image
+            width, height = size
+            rows = []
+            for row in _BAYER:
+                row = bytes(row[(i + x) % 8] * 4 + 2 for i in range(8))
+                rows.append((row * (width // 8 + 1))[:width])
+            data = b''.join(rows[(i + y) % 8] for i in range(height))
+            dither_map = self._dither_maps[(size, x, y)] = Image.frombytes('L', size, data)
+        return dither_map
+
+    # These check and pack the arguments of image(), page() and window(),
+    # returning the arguments for _update().
+    def _pack_frame(self, image):
         imwidth, imheight = image.size
         if imwidth != self.width or imheight < self.height:
             raise ValueError('Image must be same dimensions as display ({0}x{1}) (Larger Vertical Permitted).' \
                 .format(self.width, self.height))
-        # Rotate the image 90 degrees and Grab all the pixels from the image into a list of pixels
-        # note, pixels are either 0 or 255.
-        rotated=image.rotate(90,expand = True)
-        pix = list(rotated.getdata())
-        buf = [0] * (self.width) * self._pages
-
-        # Configure Display
-        self.command(SSD1305_MEMORYMODE)
-        self.command(0x01)                    # Vertical Mode
-        self.command(SSD1305_COLUMNADDR)
-        self.command(0x00)                    # start Column 0
-        self.command(0x7F)                    # end Column 127
-        self.command(SSD1305_PAGEADDR)
-        self.command(0x00)                    # start at page 0
-        self.command(self._pages % 8)         # end at last page
-        self.command(SSD1305_SETHORZONTALNORMAL) # No L-R swap TODO: Needed??
-
-        # For each Page, Fill each Byte with 8 pixels
-        for index in range(self.width * self._pages):
-            i=(index * 8)
-            buf[index] = ((pix[i] & 1)
-                + (pix[i + 1] & 2)
-                + (pix[i + 2] & 4)
-                + (pix[i + 3] & 8)
-                + (pix[i + 4] & 16)
-                + (pix[i + 5] & 32)
-                + (pix[i + 6] & 64)
-                + (pix[i + 7] & 128))
-
-        # Finally, write whole buffer to display
-        self.data(buf)
+        return pack_image(self._mono(image), self._pages), 0, self.width - 1, 0, self._pages - 1
 
-    def page(self, image,page):
-        # Write a 1-bit PIL image to page
-        # Works by Setting vertical adressing mode, and loading the page in sideways
-        # So far this is the fastest python-based method to load a page
-        if image.mode != '1':
-            raise ValueError('Image must be in mode 1.')
+    def _pack_page(self, image, page):
         imwidth, imheight = image.size
         if imwidth != self.width or imheight < 8:
             raise ValueError('Image must be same dimensions as page ({0}x{1}) (Larger Vertical Permitted).' \
                 .format(self.width, 8))
         if page < 0 or page > 7:
             raise ValueError('Page must be 0-7')
-        # Rotate the image 90 degrees and Grab all the pixels from the image into a list of pixels
-        # note, pixels are either 0 or 255.
-        rotated=image.rotate(90,expand = True)
-        pix = list(rotated.getdata())
-        buf = [0]*(self.width)
-
-        # Configure Display
-        self.command(SSD1305_MEMORYMODE)
-        self.command(0x01)                    # Vertical Mode
-        self.command(SSD1305_COLUMNADDR)
-        self.command(0x00)                    # start Column 0
-        self.command(0x7F)                    # end Column 127
-        self.command(SSD1305_PAGEADDR)
-        self.command(page % 8)                # start at page 0
-        self.command(page % 8)                # end at last page
-        self.command(SSD1305_SETHORIZONTALNORMAL) # No L-R swap TODO: Needed??
-
-
-        for index in range(self.width):
-            i=(index * 8)
-            buf[index] = ((pix[i] & 1)
-                + (pix[i + 1] & 2)
-                + (pix[i + 2] & 4)
-                + (pix[i + 3] & 8)
-                + (pix[i + 4] & 16)
-                + (pix[i + 5] & 32)
-                + (pix[i + 6] & 64)
-                + (pix[i + 7] & 128))
-            index += 1
-        # Finally, write whole buffer to display
-        self.data(buf)
+        return pack_image(self._mono(image), 1), 0, self.width - 1, page, page
 
-    def window(self, image, page, start, end):
-        # Write a 1-bit PIL image to sub-section of a page
-        # Works by Setting vertical adressing mode, and loading the page in sideways
-        # So far this is the fastest python-based method to load a page
-        if image.mode != '1':
-            raise ValueError('Image must be in mode 1.')
+    def _pack_window(self, image, page, start, end):
         imwidth, imheight = image.size
         if imwidth != end + 1 - start or imheight < 8:
             raise ValueError('Image must be same dimensions as window ({0}x{1}) (Larger Vertical Permitted).' \
                 .format(end + 1 - start, 8))
         if start < 0 or start > 127:
             raise ValueError('Window Start must be 0-127')
-        if end < 0 or end > 255 or start > end:
+        if end < 0 or end > 127 or start > end:
             raise ValueError('Window End must be 0-127 and >= Start')
         if page < 0 or page > 7:
             raise ValueError('Page must be 0-7')
-        # Rotate the image 90 degrees and Grab all the pixels from the image into a list of pixels
-        # note, pixels are either 0 or 255.
-        rotated=image.rotate(90,expand = True)
-        pix = list(rotated.getdata())
-        buf = [0] * (end + 1 - start)
-
-        # Configure Display
-        self.command(SSD1305_MEMORYMODE)
-        self.command(0x01)                    # Vertical Mode
-        self.command(SSD1305_COLUMNADDR)
-        self.command((self.width - end - 1) % 128)  # start Column
-        self.command((self.width - start - 1) % 128)  # end Column
-        self.command(0x7F)                    # end Column 127
-        self.command(SSD1305_PAGEADDR)
-        self.command(page % 8)                # start at page 0
-        self.command(page % 8)                # end at last page
-        self.command(SSD1305_SETHORIZONTALNORMAL) # No L-R swap TODO: Needed??
-
-        for index in range(end + 1 - start):
-            #time.sleep(0.005)
-            i=(index*8)
-            buf[index] = ((pix[i] & 1)
-                + (pix[i + 1] & 2)
-                + (pix[i + 2] & 4)
-                + (pix[i + 3] & 8)
-                + (pix[i + 4] & 16)
-                + (pix[i + 5] & 32)
-                + (pix[i + 6] & 64)
-                + (pix[i + 7] & 128))
-        # Finally, write whole buffer to display
-        self.data(buf)
+        col_start = self.width - end - 1
+        return pack_image(self._mono(image, start), 1), col_start, col_start + end - start, page, page
+
+    ### Animation playback
+    def play(self, animation, loops=1, fps=None):
+        """Play an animation compiled by fast_ssd1305_anim (a file name or an
+        Animation) loops times, or for ever if loops is 0. Frames are shown at
+        the animation's own rate, or fps, timed from the start so the rate
+        doesn't drift."""
+        import fast_ssd1305_anim
+        opened = not isinstance(animation, fast_ssd1305_anim.Animation)
+        if opened:
+            animation = fast_ssd1305_anim.Animation(animation)
+        try:
+            if animation.width != self.width or animation.pages != self._pages:
+                raise ValueError('Animation must be same dimensions as display ({0}x{1}).' \
+                    .format(self.width, self.height))
+            period = 1.0 / fps if fps else animation.period
+            # Nothing is known about what is on the display yet, so the first
+            # frame is compared with the shadow copy. After that each record
+            # holds exactly what changed and is sent as is.
+            for page, start, end, data in animation.frames[0]:
+                self._update(data, start, end, page, page)
+            sequence = animation.frames[1:] + [animation.loop]
+            deadline = time.monotonic()
+            played = 1
+            while True:
+                for spans in sequence:
+                    deadline += period
+                    delay = deadline - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    if spans is animation.loop:
+                        if loops and played >= loops:
+                            return
+                        played += 1
+                    self._send_spans(spans)
+        finally:
+            if opened:
+                animation.close()
+
+    def _send_spans(self, spans):
+        # Send (page, first column, last column, page bytes) spans straight
+        # to the display, keeping the shadow copy up to date.
+        for page, start, end, data in spans:
+            self._set_window(start, end, page, page)
+            self.data(data)
+            self._buffer[page * self.width + start:page * self.width + end + 1] = data
+
+    ### Instrumentation
+    # Off by default. enable_stats() wraps the public drawing methods and the
+    # render, pack, command and data layers of this display object in timers,
+    # as attributes of the instance. disable_stats() deletes them again, so
+    # when it is off the class's own methods are called and nothing is paid.
+    _STATS_METHODS = ('image', 'page', 'window', 'blit', 'text', 'clear',
+                      'raw_frame', 'raw_page', 'raw_window', 'play', 'text_scroll',
+                      'vert_offset', 'scroll_down', 'scroll_on', 'scroll_off',
+                      'scroll_left', 'scroll_right', 'scroll_vertical_right',
+                      'scroll_vertical_left')
+    _STATS_LAYERS = {'_pack_text': 'render', '_pack_frame': 'pack', '_pack_page': 'pack',
+                     '_pack_window': 'pack', 'commands': 'command', 'data': 'data'}
+    STATS_BUCKETS_US = (50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)
+
+    def enable_stats(self, callback=None, interval=1.0):
+        """Start keeping call counts, latency histograms and bus traffic,
+        read with stats(). If callback is given it is called with stats()
+        after a public method returns, at most every interval seconds."""
+        if self._stats is not None:
+            self.disable_stats()
+        self._stats = {'lock': threading.Lock(), 'callback': callback, 'interval': interval,
+                       'pushed': time.monotonic()}
+        self.reset_stats()
+        for name in self._STATS_METHODS:
+            setattr(self, name, self._timed(getattr(self, name), 'methods', name))
+        for name, layer in self._STATS_LAYERS.items():
+            setattr(self, name, self._timed(getattr(self, name), 'layers', layer,
+                                            traffic=layer if layer in ('command', 'data') else None))
+
+    def disable_stats(self):
+        if self._stats is None:
+            return
+        for name in self._STATS_METHODS + tuple(self._STATS_LAYERS):
+            self.__dict__.pop(name, None)
+        self._stats = None
+
+    def reset_stats(self):
+        stats = self._stats
+        with stats['lock']:
+            stats['start'] = time.monotonic()
+            stats['methods'] = {}
+            stats['layers'] = {}
+            stats['bytes'] = {'command': 0, 'data': 0}
+            stats['transactions'] = 0
+
+    def stats(self):
+        """Snapshot of everything counted since enable_stats() or the last
+        reset_stats(), or None when instrumentation is off. For each method
+        and layer: calls, total/min/max seconds and a histogram of call
+        counts, bucket i counting calls up to STATS_BUCKETS_US[i]
+        microseconds and the last bucket anything slower."""
+        stats = self._stats
+        if stats is None:
+            return None
+        with stats['lock']:
+            return {
+                'seconds': time.monotonic() - stats['start'],
+                'methods': {name: dict(entry, histogram=list(entry['histogram']))
+                            for name, entry in stats['methods'].items()},
+                'layers': {name: dict(entry, histogram=list(entry['histogram']))
+                           for name, entry in stats['layers'].items()},
+                'bytes': dict(stats['bytes']),
+                'transactions': stats['transactions'],
+            }
+
+    def _timed(self, func, group, name, traffic=None):
+        # Wrap func to record its timing (and for the transport layers, the
+        # bytes and transactions it sends) under stats[group][name].
+        stats = self._stats
+        buckets = self.STATS_BUCKETS_US
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                us = seconds * 1e6
+                bucket = 0
+                while bucket < len(buckets) and us > buckets[bucket]:
+                    bucket += 1
+                with stats['lock']:
+                    entry = stats[group].get(name)
+                    if entry is None:
+                        entry = stats[group][name] = {'calls': 0, 'seconds': 0.0, 'min': seconds,
+                                                      'max': seconds, 'histogram': [0] * (len(buckets) + 1)}
+                    entry['calls'] += 1
+                    entry['seconds'] += seconds
+                    entry['min'] = min(entry['min'], seconds)
+                    entry['max'] = max(entry['max'], seconds)
+                    entry['histogram'][bucket] += 1
+                    if traffic is not None:
+                        size = len(args[0])
+                        stats['bytes'][traffic] += size
+                        if self._i2c is not None:
+                            stats['transactions'] += -(-size // self._i2c_chunk_size)
+                        else:
+                            stats['transactions'] += 1
+                if group == 'methods' and stats['callback'] is not None:
+                    now = time.monotonic()
+                    if now - stats['pushed'] >= stats['interval']:
+                        stats['pushed'] = now
+                        stats['callback'](self.stats())
+        return timed
+
+    ### Threaded mode
+    # A writer thread sends submitted frames in the background. Submissions
+    # are packed into a back buffer and the writer swaps it with the front
+    # buffer before sending, so whatever was submitted most recently wins and
+    # anything it overwrote before being sent is simply never sent.
+    def start_writer(self):
+        """Start the background writer thread. While it runs, draw with
+        submit(), submit_page() and submit_window(), and call flush() before
+        calling anything else that talks to the display."""
+        if self._writer is not None:
+            return
+        self._front = bytearray(self.width * 8)
+        self._back = bytearray(self.width * 8)
+        self._dirty = {}          # page: [(col_start, col_end), ...] waiting in the back buffer
+        self._submitted = 0       # Number of submissions so far
+        self._sent = 0            # Submissions that have reached the display
+        self._writer_error = None
+        self._running = True
+        self._cond = threading.Condition()
+        self._writer = threading.Thread(target=self._writer_loop, name='fast_ssd1305 writer')
+        self._writer.daemon = True
+        self._writer.start()
+
+    def stop_writer(self, flush=True):
+        """Stop the background writer thread, by default after sending
+        anything still waiting."""
+        if self._writer is None:
+            return
+        with self._cond:
+            if not flush:
+                self._dirty = {}
+            self._running = False
+            self._cond.notify_all()
+        self._writer.join()
+        self._writer = None
+        self._check_writer()
+
+    def submit(self, image):
+        """Queue a whole frame for the writer thread."""
+        self._submit(*self._pack_frame(image))
+
+    def submit_page(self, image, page):
+        """Queue a page for the writer thread."""
+        self._submit(*self._pack_page(image, page))
+
+    def submit_window(self, image, page, start, end):
+        """Queue part of a page for the writer thread."""
+        self._submit(*self._pack_window(image, page, start, end))
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted so far is on the display. Returns
+        False if the timeout ran out first."""
+        if self._writer is None:
+            return True
+        with self._cond:
+            target = self._submitted
+            end = None if timeout is None else time.monotonic() + timeout
+            while self._sent < target and self._writer_error is None:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        self._check_writer()
+        return True
+
+    def _check_writer(self):
+        # Pass on any error from the writer thread to the caller.
+        error, self._writer_error = self._writer_error, None
+        if error is not None:
+            raise error
+
+    def _submit(self, buf, col_start, col_end, page_start, page_end):
+        if self._writer is None:
+            raise RuntimeError('Writer thread is not running, call start_writer() first.')
+        width = col_end + 1 - col_start
+        with self._cond:
+            self._check_writer()
+            # Only count it as coalesced if it overwrites something unsent.
+            if any(s <= col_end and e >= col_start
+                   for page in range(page_start, page_end + 1)
+                   for s, e in self._dirty.get(page, ())):
+                self.frames_coalesced += 1
+            for i, page in enumerate(range(page_start, page_end + 1)):
+                offset = page * self.width + col_start
+                self._back[offset:offset + width] = buf[i * width:(i + 1) * width]
+                spans = [span for span in self._dirty.get(page, ())
+                         if span[0] < col_start or span[1] > col_end]
+                if not any(s <= col_start and e >= col_end for s, e in spans):
+                    spans.append((col_start, col_end))
+                self._dirty[page] = spans
+            self._submitted += 1
+            self._cond.notify_all()
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._dirty:
+                    self._cond.wait()
+                if not self._dirty:
+                    return
+                self._front, self._back = self._back, self._front
+                dirty, self._dirty = self._dirty, {}
+                target = self._submitted
+            try:
+                self._send_dirty(self._front, dirty)
+            except Exception as e:
+                # What failed is thrown away, so flush() mustn't wait for it,
+                # and the shadow copy of those pages can't be trusted.
+                with self._cond:
+                    self._writer_error = e
+                    self._sent = target
+                    for page in dirty:
+                        self.invalidate(page)
+                    self._cond.notify_all()
+                continue
+            with self._cond:
+                self._sent = target
+                self._cond.notify_all()
+
+    def _send_dirty(self, buf, dirty):
+        # Send the dirty spans of buf, doing runs of pages with the same
+        # single span (like a whole frame) as one window.
+        pages = sorted(dirty)
+        while pages:
+            first = pages.pop(0)
+            spans = dirty[first]
+            last = first
+            if len(spans) == 1:
+                while pages and pages[0] == last + 1 and dirty[pages[0]] == spans:
+                    last = pages.pop(0)
+            for start, end in spans:
+                self._update(b''.join(buf[page * self.width + start:page * self.width + end + 1]
+                                      for page in range(first, last + 1)),
+                             start, end, first, last)
 
     def set_contrast(self, contrast):
         """Sets the contrast of the display.  Contrast should be a value between
         0 and 255."""
         if contrast < 0 or contrast > 255:
             raise ValueError('Contrast must be a value from 0 to 255 (inclusive).')
-        self.command(SSD1305_SETCONTRAST)
-        self.command(contrast)
+        self.commands((SSD1305_SETCONTRAST, contrast))
 
     def dim(self, dim):
         """Adjusts contrast to dim the display if dim is True, otherwise sets the
@@ -407,6 +1065,8 @@ class fast_ssd1305Base(object):
         self.command(0x40+(self._vert_offset))
 
     def scroll_on(self):
+        # Horizontal scrolling moves data around in GDDRAM.
+        self.invalidate()
         self.command(SSD1305_ACTIVATE_SCROLL)
 
     def scroll_off(self):
@@ -417,33 +1077,33 @@ class fast_ssd1305Base(object):
             raise ValueError('Scroll Area Start  must be a value from 0 to 63 (inclusive).')
         if end < 0 or end > 127:
             raise ValueError('Scroll Area End  must be a value from 0 to 127 (inclusive). ')
-        self.command(SSD1305_SET_VERTICAL_SCROLL_AREA)
-        self.command(start % 64)
-        self.command(end % 128)
+        self.commands((SSD1305_SET_VERTICAL_SCROLL_AREA, start % 64, end % 128))
 
     def scroll_left(self, amount, speed):
         if amount < 0 or amount > 255:
             raise ValueError('Scroll Amount must be a value from 0 to 255 (inclusive).')
         if speed < 0 or speed > 6:
             raise ValueError('Scroll Speed must be a value from 0 to 6 (inclusive).')
-        self.command(SSD1305_LEFT_HORIZONTAL_SCROLL)
-        self.command(amount % 256)
-        self.command(0x00) # Start Page 0
-        self.command(speed % 7)
-        self.command(0x03) # End Page 7
-        self.scroll_on()
+        self.invalidate()
+        self.commands((SSD1305_LEFT_HORIZONTAL_SCROLL,
+                       amount % 256,
+                       0x00, # Start Page 0
+                       speed % 7,
+                       0x03, # End Page 7
+                       SSD1305_ACTIVATE_SCROLL))
 
     def scroll_right(self, amount, speed):
         if amount < 0 or amount > 255:
             raise ValueError('Scroll Amount must be a value from 0 to 255 (inclusive).')
         if speed < 0 or speed > 6:
             raise ValueError('Scroll Speed must be a value from 0 to 6 (inclusive).')
-        self.command(SSD1305_RIGHT_HORIZONTAL_SCROLL)
-        self.command(amount % 256)
-        self.command(0x00) # Start Page 0
-        self.command(speed % 7)
-        self.command(0x07) # End Page 7
-        self.scroll_on()
+        self.invalidate()
+        self.commands((SSD1305_RIGHT_HORIZONTAL_SCROLL,
+                       amount % 256,
+                       0x00, # Start Page 0
+                       speed % 7,
+                       0x07, # End Page 7
+                       SSD1305_ACTIVATE_SCROLL))
 
     def scroll_vertical_right(self, h_amount, v_amount, speed):
         if h_amount < 0 or h_amount > 4:
@@ -452,13 +1112,14 @@ class fast_ssd1305Base(object):
             raise ValueError('Vertical Scroll Amount must be a value from 0 to 64 (inclusive).')
         if speed < 0 or speed > 6:
             raise ValueError('Scroll Speed must be a value from 0 to 6 (inclusive).')
-        self.command(SSD1305_VERTICAL_AND_RIGHT_HORIZONTAL_SCROLL)
-        self.command(h_amount % 5)
-        self.command(0x01) # Start Page 0
-        self.command(speed % 7)
-        self.command(0x07) # End Page 7
-        self.command(v_amount % 64)
-        self.scroll_on()
+        self.invalidate()
+        self.commands((SSD1305_VERTICAL_AND_RIGHT_HORIZONTAL_SCROLL,
+                       h_amount % 5,
+                       0x01, # Start Page 0
+                       speed % 7,
+                       0x07, # End Page 7
+                       v_amount % 64,
+                       SSD1305_ACTIVATE_SCROLL))
 
     def scroll_vertical_left(self, h_amount, v_amount, speed):
         if h_amount < 0 or h_amount > 4:
@@ -467,101 +1128,155 @@ class fast_ssd1305Base(object):
             raise ValueError('Vertical Scroll Amount must be a value from 0 to 64 (inclusive).')
         if speed < 0 or speed > 6:
             raise ValueError('Scroll Speed must be a value from 0 to 6 (inclusive).')
-        self.command(SSD1305_VERTICAL_AND_LEFT_HORIZONTAL_SCROLL)
-        self.command(h_amount % 5)
-        self.command(0x01) # Start Page 0
-        self.command(speed % 7)
-        self.command(0x07) # End Page 7
-        self.command(v_amount % 64)
-        self.scroll_on()
+        self.invalidate()
+        self.commands((SSD1305_VERTICAL_AND_LEFT_HORIZONTAL_SCROLL,
+                       h_amount % 5,
+                       0x01, # Start Page 0
+                       speed % 7,
+                       0x07, # End Page 7
+                       v_amount % 64,
+                       SSD1305_ACTIVATE_SCROLL))
 
     ### Fancy Text scrolling routine
     def text_scroll(self,text,size):
-        if (size == 8):
-            font = ImageFont.truetype('pressstart2p.ttf',8)
-            scroll = 1
-        elif (size == 16):
-            font = ImageFont.truetype('perfect_dos_vga_437.ttf',16)
-            scroll = 2
-        else:
-            raise ValueError('Font size must be 8 or 16')
+        for lines in self._scroll_chunks(text, size):
+            for i in range (self._scroll_line(lines)):
+                self.scroll_down(1)
+                time.sleep(.05)
+
+    def _scroll_chunks(self, text, size):
+        # Split text into lines for text_scroll(), returning the page bytes
+        # of each line.
+        atlas = _atlas(size)
         max_line_length=15
         chunks = [text[i:i+max_line_length] for i in range(0, len(text), max_line_length)]
         c = 1
         indent=0
+        out = []
         for text in chunks:
-            self._pagedraw.rectangle((0,0,self.width,8),outline=0,fill=0)
             if (c > 1):
-                self._pagedraw.point([(0,6),(2,6)],fill=255)
                 indent=4
-            self._pagedraw.text((indent,0), text, font=font,fill=255)
+            lines = atlas.render(text, self.width, indent)
+            # Continuation marks, as dots on row 6 of the top page
+            if (c > 1):
+                lines[0][0] |= 0x40
+                lines[0][2] |= 0x40
             if (c < len(chunks)):
-                self._pagedraw.point([(self.width-1,6),(self.width-3,6)],fill=255)
-            self.page(self._pageimage,self._text_line % 8)
-            if (scroll == 2) :
-                self._pagedraw.rectangle((0,0,self.width,8),outline=0,fill=0)
-                self._pagedraw.text((indent,-8), text, font=font,fill=255)
-                self.page(self._pageimage,(self._text_line+1) % 8)
-            self._text_line += scroll
-            if (self._text_line > 4):
-                for i in range (size):
-                    self.scroll_down(1)
-                    time.sleep(.05)
+                lines[0][self.width-1] |= 0x40
+                lines[0][self.width-3] |= 0x40
+            out.append(lines)
             c += 1
+        return out
+
+    def _scroll_line(self, lines):
+        # Write one line from _scroll_chunks() at the next text position, and
+        # return how many rows the display should scroll down to show it.
+        for i, line in enumerate(lines):
+            page = (self._text_line + i) % 8
+            self._update(line[::-1], 0, self.width - 1, page, page)
+        self._text_line += len(lines)
+        if (self._text_line > 4):
+            return len(lines) * 8
+        return 0
+
+    ### asyncio
+    # Awaitable versions of the drawing functions. Bus writes run on a single
+    # worker thread per display, so they never block the event loop and still
+    # happen in the order they were awaited. Animations are paced against the
+    # loop clock, so they don't drift, and can be cancelled between steps.
+    def call_async(self, func, *args):
+        """Run func(*args) on the display's worker thread, returning an
+        awaitable for its result."""
+        import asyncio
+        import concurrent.futures
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        return asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(func, *args))
+
+    async def image_async(self, image):
+        await self.call_async(self.image, image)
+
+    async def page_async(self, image, page):
+        await self.call_async(self.page, image, page)
+
+    async def window_async(self, image, page, start, end):
+        await self.call_async(self.window, image, page, start, end)
+
+    async def text_async(self, text, size, line):
+        await self.call_async(self.text, text, size, line)
+
+    async def scroll_down_async(self, step, interval=None):
+        """Scroll down step rows. With an interval, scroll one row at a time,
+        interval seconds apart."""
+        if interval is None:
+            await self.call_async(self.scroll_down, step)
+            return
+        import asyncio
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        for i in range(step):
+            await self.call_async(self.scroll_down, 1)
+            deadline += interval
+            await asyncio.sleep(max(0, deadline - loop.time()))
+
+    async def text_scroll_async(self, text, size, interval=.05):
+        """Like text_scroll(), but awaitable. Cancelling it stops the scroll
+        at the row it has reached."""
+        for lines in await self.call_async(self._scroll_chunks, text, size):
+            rows = await self.call_async(self._scroll_line, lines)
+            await self.scroll_down_async(rows, interval)
 
     ### Just draw some text
     def text (self,text,size,line):
-        if (size == 8):
-            font = ImageFont.truetype('pressstart2p.ttf',8)
-            scroll = 1
-        elif (size == 16):
-            font = ImageFont.truetype('perfect_dos_vga_437.ttf',16)
-            scroll = 2
-        else:
-            raise ValueError('Font size must be 8 or 16')
+        self._update(*self._pack_text(text, size, line))
+
+    def _pack_text(self, text, size, line):
+        # Like the _pack_* functions above, but for text()
+        atlas = _atlas(size)
         if line < 0 or line > 7:
             raise ValueError('Text Line must be a value from 0 to 7 (inclusive).')
-        self._pagedraw.rectangle((0,0,self.width,8),outline=0,fill=0)
-        self._pagedraw.text((0,0), text, font=font,fill=255)
-        self.page(self._pageimage,line % 8)
-        if (size == 16 and line < 6) :
-            self._pagedraw.rectangle((0,0,self.width,8),outline=0,fill=0)
-            self._pagedraw.text((0,-8), text, font=font,fill=255)
-            self.page(self._pageimage,(line + 1) % 8)
+        lines = atlas.render(text, self.width)
+        if (line >= 6) :
+            lines = lines[:1]   # Only the top half of 16px text at the bottom
+        return b''.join(l[::-1] for l in lines), 0, self.width - 1, line, line + len(lines) - 1
 
 ### Configuration for Waveshare 128 x 32 pixel display
 class SSD1305_128_32(fast_ssd1305Base):
     def __init__(self, rst, dc=None, sclk=None, din=None, cs=None, gpio=None,
                  spi=None, i2c_bus=None, i2c_address=SSD1305_I2C_ADDRESS,
-                 i2c=None):
+                 i2c=None, i2c_chunk_size=32):
         # Call base class constructor. Define resolution here
         super(SSD1305_128_32, self).__init__(128, 32, rst, dc, sclk, din, cs,
-                                             gpio, spi, i2c_bus, i2c_address, i2c)
+                                             gpio, spi, i2c_bus, i2c_address, i2c,
+                                             i2c_chunk_size)
     def _initialize(self):
         # 128x32 pixel specific initialization.
-        self.command(SSD1305_DISPLAYOFF)
-        self.command(SSD1305_SETLOWCOLUMN + 4)   #--set the lower nibble of the column start addr to 4
-        self.command(SSD1305_SETHIGHCOLUMN + 0)  #--set the higher nibble of the column start addr to 0
-        self.command(SSD1305_SETSTARTLINE + 0)   #--set start line
-        self.command(SSD1305_SETCONTRAST)
-        self.command(0x80)                       # Contrast Mid
-        self.command(SSD1305_SETHORIZONTALREVERSE)# Column address 131 is mapped to SEG0
-        self.command(SSD1305_NORMALDISPLAY)      # Set Normal Display, not Inverse.
-        self.command(SSD1305_SETMULTIPLEX)
-        self.command(0x1F)                       # -- Set Multiplex --to 1/64 duty
-        self.command(SSD1305_COMSCANDEC)         #--set COM Output Scan Direction to reverse
-        self.command(SSD1305_SETDISPLAYOFFSET)
-        self.command(0x00)                       #--set vertical shift to zero
-        self.command(SSD1305_SETDISPLAYCLOCKDIV) #-set display clock divide ratio/oscillator frequency...
-        self.command(0xF0)                       #..to Clock as 100 Frames/Sec (divide 0, Freg 15)
-        self.command(SSD1305_SETCOLOURLOWPOWER)  #--set Area Colour mode and low power mode...
-        self.command(0x05)                       #... to Monochrome, low power mode
-        #self.command(0x35)                      #--Area Color mode, low power mode
-        self.command(SSD1305_SETPRECHARGE)
-        self.command(0xC2)                       #-- Set Pre-Charge to 15 Clocks & Discharge as 1 Clock
-        self.command(SSD1305_SETCOMPINS)
-        self.command(0x12)                       # Set COM pins Hardware config to alternative pin config, no COM L/R remap
-        self.command(SSD1305_SETVCOMDETECT)
-        self.command(0x08)                      #Set VCOM Deselect Level to 0010b
-        #self.command(0x00)                       #Set VCOM Deselect Level to 0000b
-        self.command(SSD1305_DISPLAYON)
+        self.commands((
+            SSD1305_DISPLAYOFF,
+            SSD1305_SETLOWCOLUMN + 4,   #--set the lower nibble of the column start addr to 4
+            SSD1305_SETHIGHCOLUMN + 0,  #--set the higher nibble of the column start addr to 0
+            SSD1305_SETSTARTLINE + 0,   #--set start line
+            SSD1305_SETCONTRAST,
+            0x80,                       # Contrast Mid
+            SSD1305_SETHORIZONTALREVERSE,# Column address 131 is mapped to SEG0
+            SSD1305_NORMALDISPLAY,      # Set Normal Display, not Inverse.
+            SSD1305_SETMULTIPLEX,
+            0x1F,                       # -- Set Multiplex --to 1/64 duty
+            SSD1305_COMSCANDEC,         #--set COM Output Scan Direction to reverse
+            SSD1305_SETDISPLAYOFFSET,
+            0x00,                       #--set vertical shift to zero
+            SSD1305_SETDISPLAYCLOCKDIV, #-set display clock divide ratio/oscillator frequency...
+            0xF0,                       #..to Clock as 100 Frames/Sec (divide 0, Freg 15)
+            SSD1305_SETCOLOURLOWPOWER,  #--set Area Colour mode and low power mode...
+            0x05,                       #... to Monochrome, low power mode
+            #0x35,                      #--Area Color mode, low power mode
+            SSD1305_SETPRECHARGE,
+            0xC2,                       #-- Set Pre-Charge to 15 Clocks & Discharge as 1 Clock
+            SSD1305_SETCOMPINS,
+            0x12,                       # Set COM pins Hardware config to alternative pin config, no COM L/R remap
+            SSD1305_SETVCOMDETECT,
+            0x08,                      #Set VCOM Deselect Level to 0010b
+            #0x00,                       #Set VCOM Deselect Level to 0000b
+            SSD1305_DISPLAYALLON_RESUME,# Show RAM contents, not all on
+            SSD1305_DISPLAYON,
+        ))
@@ -0,0 +1,151 @@
+# Pre-packed animations for fast_ssd1305
+# compile_animation() turns a GIF or a list of images into a file of page
+# bytes: the first frame in full, then for each frame only the column spans
+# that changed since the one before, plus a last record going from the final
+# frame back to the first for looping. Animation memory maps such a file and
+# fast_ssd1305Base.play() streams it, with nothing left to pack or parse.
+#
+# File layout (little endian):
+#   header  'SSDA', version (B), pages (B), width (H), frames (I),
+#           frame period in microseconds (I)
+#   index   frames + 1 record offsets (I), the last is the loop record
+#   record  span count (H), then per span: page (B), first column (B),
+#           last column (B) and the page bytes of those columns
+#
+# Usage: python fast_ssd1305_anim.py input.gif output.ssda [--fps N]
+#
+
+import argparse
+import mmap
+import struct
+
+from PIL import Image, ImageSequence
+
+import fast_ssd1305
+
+MAGIC = b'SSDA'
+VERSION = 1
+_HEADER = struct.Struct('<4sBBHII')
+_SPAN = struct.Struct('<BBB')
+
+
+def _frames(source):
+    # PIL images from a file name, an open image or a sequence of either.
+    if isinstance(source, (str, Image.Image)):
+        image = Image.open(source) if isinstance(source, str) else source
+        for frame in ImageSequence.Iterator(image):
+            yield frame.copy(), frame.info.get('duration')
+    else:
+        for item in source:
+            image = Image.open(item) if isinstance(item, str) else item
+            yield image, image.info.get('duration')
+
+
+def _record(new, old, width, pages):
+    # Spans of new that differ from old (all of it if old is None).
+    spans = []
+    for page in range(pages):
+        row = new[page * width:(page + 1) * width]
+        if old is None:
+            changed = [(0, width - 1)]
+        else:
+            changed = fast_ssd1305._diff_spans(row, old[page * width:(page + 1) * width], 6)
+        for start, end in changed:
+            spans.append(_SPAN.pack(page, start, end) + bytes(row[start:end + 1]))
+    return struct.pack('<H', len(spans)) + b''.join(spans)
+
+
+def compile_animation(source, path, fps=None, width=128, height=32):
+    """Compile a GIF (or a list of images or file names) into an animation
+    file. Frames are converted to 1 bit if need be and must be width x
+    height. The frame rate comes from fps, or else the first frame's GIF
+    duration, or else 10 frames per second."""
+    pages = height // 8
+    packed = []
+    period = None
+    for image, duration in _frames(source):
+        if image.size != (width, height):
+            raise ValueError('Frames must be {0}x{1}.'.format(width, height))
+        if image.mode != '1':
+            image = image.convert('1')
+        if period is None and duration:
+            period = int(duration) * 1000
+        packed.append(fast_ssd1305.pack_image(image, pages))
+    if not packed:
+        raise ValueError('No frames to compile.')
+    if fps:
+        period = int(1e6 / fps)
+    elif not period:
+        period = 100000
+    records = [_record(packed[0], None, width, pages)]
+    for previous, frame in zip(packed, packed[1:]):
+        records.append(_record(frame, previous, width, pages))
+    records.append(_record(packed[0], packed[-1], width, pages))
+    offset = _HEADER.size + 4 * len(records)
+    index = []
+    for record in records:
+        index.append(offset)
+        offset += len(record)
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, pages, width, len(packed), period))
+        f.write(struct.pack('<{0}I'.format(len(index)), *index))
+        for record in records:
+            f.write(record)
+
+
+class Animation(object):
+    """A compiled animation, memory mapped. frames[n] is a list of
+    (page, first column, last column, page bytes) spans taking frame n-1 to
+    frame n, with frames[0] the first frame in full and loop taking the last
+    frame back to the first. The page bytes are views into the file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.pages, self.width, count, self.period_us = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a fast_ssd1305 animation file.')
+        self.period = self.period_us / 1e6
+        self._view = view = memoryview(self._map)
+        offsets = struct.unpack_from('<{0}I'.format(count + 1), self._map, _HEADER.size)
+        records = []
+        for offset in offsets:
+            spans = []
+            (n,) = struct.unpack_from('<H', self._map, offset)
+            offset += 2
+            for _ in range(n):
+                page, start, end = _SPAN.unpack_from(self._map, offset)
+                offset += _SPAN.size
+                spans.append((page, start, end, view[offset:offset + end + 1 - start]))
+                offset += end + 1 - start
+            records.append(spans)
+        self.frames = records[:-1]
+        self.loop = records[-1]
+
+    def __len__(self):
+        return len(self.frames)
+
+    def close(self):
+        # The views into the file have to go before it can be unmapped.
+        for spans in self.frames + [self.loop]:
+            for span in spans:
+                span[3].release()
+        self.frames = self.loop = None
+        self._view.release()
+        self._map.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compile a GIF or images into a fast_ssd1305 animation.')
+    parser.add_argument('input', nargs='+', help='A GIF, or several image files in order')
+    parser.add_argument('output')
+    parser.add_argument('--fps', type=float, default=None)
+    parser.add_argument('--width', type=int, default=128)
+    parser.add_argument('--height', type=int, default=32)
+    args = parser.parse_args(argv)
+    source = args.input[0] if len(args.input) == 1 else args.input
+    compile_animation(source, args.output, args.fps, args.width, args.height)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+# Benchmarks for fast_ssd1305
+# Runs the driver against a recording stand-in bus and reports frames per
+# second, CPU time per call (split into packing and transport) and bytes and
+# transactions per call. Bus time is simulated from a configurable clock, so
+# results are repeatable on any machine.
+#
+# Usage: python fast_ssd1305_bench.py [--bus spi|i2c] [--clock-hz N] [--json]
+#        python fast_ssd1305_bench.py --startup
+#
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from PIL import Image
+
+import fast_ssd1305
+
+
+class RecordingBus(object):
+    """Stand-in for the SPI, I2C and GPIO objects. Counts what the driver
+    sends and how long it would take on a bus running at clock_hz, without
+    decoding any of it."""
+
+    def __init__(self, dc=None, clock_hz=8000000, i2c=False,
+                 transaction_us=10.0, gpio_us=1.0):
+        self._dc = dc
+        self.clock_hz = clock_hz
+        self.i2c = i2c
+        self.transaction_us = transaction_us   # Fixed cost of each transfer
+        self.gpio_us = gpio_us                 # Cost of each GPIO change
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.bytes = 0
+        self.transactions = 0
+        self.dc_toggles = 0
+        self.bus_seconds = 0.0
+
+    def _transfer(self, count):
+        self.bytes += count
+        self.transactions += 1
+        if self.i2c:
+            # Address byte and control byte, plus an ack bit on every byte.
+            bits = (count + 2) * 9
+        else:
+            bits = count * 8
+        self.bus_seconds += bits / float(self.clock_hz) + self.transaction_us / 1e6
+
+    # GPIO
+    def setup(self, pin, mode, pull_up_down=None):
+        pass
+
+    def set_high(self, pin):
+        self._gpio(pin)
+
+    def set_low(self, pin):
+        self._gpio(pin)
+
+    def _gpio(self, pin):
+        if pin == self._dc:
+            self.dc_toggles += 1
+        self.bus_seconds += self.gpio_us / 1e6
+
+    # SPI
+    def set_clock_hz(self, hz):
+        # The driver asks for its own clock, but the simulated one wins.
+        pass
+
+    def write(self, data, assert_ss=True, deassert_ss=True):
+        self._transfer(len(data))
+
+    # I2C
+    def get_i2c_device(self, address, **kwargs):
+        return self
+
+    def write8(self, register, value):
+        self._transfer(1)
+
+    def writeList(self, register, data):
+        self._transfer(len(data))
+
+
+class _Sleep(object):
+    # Replaces the time module inside fast_ssd1305 so animation pauses are
+    # counted instead of slept.
+    def __init__(self):
+        self.seconds = 0.0
+
+    def sleep(self, seconds):
+        self.seconds += seconds
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+class _Timer(object):
+    # Adds up the time spent in the functions it wraps. Calls made from
+    # inside another wrapped function are not counted twice.
+    def __init__(self):
+        self.seconds = 0.0
+        self._depth = 0
+
+    def wrap(self, func):
+        def timed(*args, **kwargs):
+            if self._depth:
+                return func(*args, **kwargs)
+            self._depth += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start
+                self._depth -= 1
+        timed.wrapped = func
+        return timed
+
+
+def _random_frame(width, height, rng, density=0.3):
+    data = bytes(rng.getrandbits(8) if rng.random() < density * 2 else 0
+                 for _ in range(((width + 7) // 8) * height))
+    return Image.frombytes('1', (width, height), data)
+
+
+def _operations(display, rng):
+    # Each entry is (name, function called once per iteration).
+    width, height = display.width, display.height
+    frames = [_random_frame(width, height, rng) for _ in range(8)]
+    pages = [_random_frame(width, 8, rng) for _ in range(8)]
+    windows = [_random_frame(32, 8, rng) for _ in range(8)]
+    delta = frames[0].copy()
+    state = {'i': 0}
+
+    def step():
+        state['i'] += 1
+        return state['i']
+
+    def image_delta():
+        # A clock-like update: one small area changes each frame.
+        i = step()
+        delta.paste((i // 12) % 2, (8 * (i % 12), 8, 8 * (i % 12) + 6, 14))
+        display.image(delta)
+
+    ops = [
+        ('image', lambda: display.image(frames[step() % len(frames)])),
+        ('image_delta', image_delta),
+        ('page', lambda: display.page(pages[step() % len(pages)], state['i'] % 4)),
+        ('window', lambda: display.window(windows[step() % len(windows)], state['i'] % 4, 48, 79)),
+        ('clear', display.clear),
+        ('text', lambda: display.text('{0:08d}'.format(step()), 8, 0)),
+        ('text_scroll', lambda: display.text_scroll('line {0}'.format(step()), 8)),
+        ('scroll_down', lambda: display.scroll_down(1)),
+        ('scroll_left', lambda: display.scroll_left(1, 0)),
+        ('scroll_right', lambda: display.scroll_right(1, 0)),
+        ('scroll_vertical_right', lambda: display.scroll_vertical_right(1, 1, 0)),
+        ('scroll_vertical_left', lambda: display.scroll_vertical_left(1, 1, 0)),
+        ('scroll_off', display.scroll_off),
+    ]
+    return ops
+
+
+def run(bus='spi', clock_hz=None, iterations=200, ops=None, seed=0,
+        transaction_us=10.0, gpio_us=1.0):
+    """Run the benchmarks and return the results as a dict."""
+    if clock_hz is None:
+        clock_hz = 400000 if bus == 'i2c' else 8000000
+    rng = random.Random(seed)
+    stand_in = RecordingBus(dc=0, clock_hz=clock_hz, i2c=bus == 'i2c',
+                            transaction_us=transaction_us, gpio_us=gpio_us)
+    if bus == 'i2c':
+        display = fast_ssd1305.SSD1305_128_32(None, i2c=stand_in, gpio=stand_in)
+    else:
+        display = fast_ssd1305.SSD1305_128_32(None, dc=0, spi=stand_in, gpio=stand_in)
+    display.begin()
+    display.clear()
+
+    # Time packing and transport separately by wrapping them.
+    packing, transport = _Timer(), _Timer()
+    packers = ('pack_image', 'pack_rows')
+    display.commands = transport.wrap(display.commands)
+    display.data = transport.wrap(display.data)
+    sleeper = _Sleep()
+    real_time = fast_ssd1305.time
+
+    results = []
+    try:
+        for name in packers:
+            setattr(fast_ssd1305, name, packing.wrap(getattr(fast_ssd1305, name)))
+        fast_ssd1305.time = sleeper
+        for name, func in _operations(display, rng):
+            if ops and name not in ops:
+                continue
+            try:
+                func()
+            except (IOError, OSError) as e:
+                # Fonts for the text functions may not be installed.
+                results.append({'op': name, 'error': str(e)})
+                continue
+            packing.seconds = transport.seconds = 0.0
+            sleeper.seconds = 0.0
+            stand_in.reset_counters()
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            total = time.perf_counter() - start
+            pack, sent = packing.seconds, transport.seconds
+            per_call = (total + stand_in.bus_seconds) / iterations
+            results.append({
+                'op': name,
+                'calls': iterations,
+                'fps': 1.0 / per_call if per_call else None,
+                'cpu_us': 1e6 * total / iterations,
+                'pack_us': 1e6 * pack / iterations,
+                'transport_us': 1e6 * sent / iterations,
+                'other_us': 1e6 * (total - pack - sent) / iterations,
+                'bus_us': 1e6 * stand_in.bus_seconds / iterations,
+                'paced_us': 1e6 * sleeper.seconds / iterations,
+                'bytes': stand_in.bytes / float(iterations),
+                'transactions': stand_in.transactions / float(iterations),
+                'dc_toggles': stand_in.dc_toggles / float(iterations),
+            })
+    finally:
+        for name in packers:
+            setattr(fast_ssd1305, name, getattr(fast_ssd1305, name).wrapped)
+        fast_ssd1305.time = real_time
+    return {
+        'bus': bus,
+        'clock_hz': clock_hz,
+        'transaction_us': transaction_us,
+        'gpio_us': gpio_us,
+        'iterations': iterations,
+        'numpy': fast_ssd1305.numpy is not None,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+_IMPORT_SCRIPT = '''
+import time
+start = time.perf_counter()
+import fast_ssd1305
+print(time.perf_counter() - start)
+'''
+
+def startup(bus='spi', clock_hz=None, iterations=20, transaction_us=10.0, gpio_us=1.0):
+    """Measure how long it takes to get a display going: importing the
+    module in a fresh interpreter, then creating the display object and
+    calling begin(), with and without reinitializing the panel. Reset pauses
+    are counted rather than slept. Returns the results as a dict."""
+    if clock_hz is None:
+        clock_hz = 400000 if bus == 'i2c' else 8000000
+    here = os.path.dirname(os.path.abspath(fast_ssd1305.__file__))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([here] + [p for p in [env.get('PYTHONPATH')] if p])
+    imports = []
+    for _ in range(max(1, iterations // 4)):
+        out = subprocess.check_output([sys.executable, '-c', _IMPORT_SCRIPT], env=env)
+        imports.append(float(out.decode().split()[-1]))
+    results = []
+    sleeper = _Sleep()
+    real_time = fast_ssd1305.time
+    try:
+        fast_ssd1305.time = sleeper
+        for reinit in (True, False):
+            stand_in = RecordingBus(dc=0, clock_hz=clock_hz, i2c=bus == 'i2c',
+                                    transaction_us=transaction_us, gpio_us=gpio_us)
+            sleeper.seconds = 0.0
+            start = time.perf_counter()
+            for _ in range(iterations):
+                if bus == 'i2c':
+                    display = fast_ssd1305.SSD1305_128_32(1, i2c=stand_in, gpio=stand_in)
+                else:
+                    display = fast_ssd1305.SSD1305_128_32(1, dc=0, spi=stand_in, gpio=stand_in)
+                display.begin(reinit=reinit)
+            total = time.perf_counter() - start
+            results.append({
+                'op': 'begin' if reinit else 'begin(reinit=False)',
+                'cpu_us': 1e6 * total / iterations,
+                'bus_us': 1e6 * stand_in.bus_seconds / iterations,
+                'paced_us': 1e6 * sleeper.seconds / iterations,
+                'bytes': stand_in.bytes / float(iterations),
+                'transactions': stand_in.transactions / float(iterations),
+            })
+    finally:
+        fast_ssd1305.time = real_time
+    return {
+        'bus': bus,
+        'clock_hz': clock_hz,
+        'import_ms': 1e3 * min(imports),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+def _print_startup(report, out):
+    out.write('bus={bus} clock={clock_hz}Hz python={python}\n'.format(**report))
+    out.write('import fast_ssd1305: {0:.1f}ms\n'.format(report['import_ms']))
+    columns = ('op', 'cpu_us', 'bus_us', 'paced_us', 'bytes', 'transactions')
+    out.write('{0:<22}{1:>10}{2:>10}{3:>10}{4:>8}{5:>13}\n'.format(*columns))
+    for r in report['results']:
+        out.write('{op:<22}{cpu_us:>10.1f}{bus_us:>10.1f}{paced_us:>10.1f}{bytes:>8.0f}'
+                  '{transactions:>13.1f}\n'.format(**r))
+
+
+def _print_table(report, out):
+    out.write('bus={bus} clock={clock_hz}Hz numpy={numpy} python={python}\n'.format(**report))
+    columns = ('op', 'fps', 'cpu_us', 'pack_us', 'transport_us', 'bus_us', 'bytes', 'transactions')
+    out.write('{0:<22}{1:>10}{2:>10}{3:>10}{4:>13}{5:>10}{6:>8}{7:>13}\n'.format(*columns))
+    for r in report['results']:
+        if 'error' in r:
+            out.write('{0:<22}  skipped: {1}\n'.format(r['op'], r['error']))
+            continue
+        out.write('{op:<22}{fps:>10.1f}{cpu_us:>10.1f}{pack_us:>10.1f}{transport_us:>13.1f}'
+                  '{bus_us:>10.1f}{bytes:>8.0f}{transactions:>13.1f}\n'.format(**r))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark fast_ssd1305 against a simulated bus.')
+    parser.add_argument('--bus', choices=('spi', 'i2c'), default='spi')
+    parser.add_argument('--clock-hz', type=int, default=None,
+                        help='Simulated bus clock (default 8MHz SPI, 400kHz I2C)')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--transaction-us', type=float, default=10.0,
+                        help='Simulated fixed cost of each bus transfer')
+    parser.add_argument('--gpio-us', type=float, default=1.0,
+                        help='Simulated cost of each GPIO change')
+    parser.add_argument('--op', action='append', dest='ops',
+                        help='Only run this operation (may be repeated)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    parser.add_argument('--startup', action='store_true',
+                        help='Measure import and begin() time instead')
+    args = parser.parse_args(argv)
+    if args.startup:
+        report = startup(args.bus, args.clock_hz, args.iterations // 10,
+                         args.transaction_us, args.gpio_us)
+    else:
+        report = run(args.bus, args.clock_hz, args.iterations, args.ops, args.seed,
+                     args.transaction_us, args.gpio_us)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    elif args.startup:
+        _print_startup(report, sys.stdout)
+    else:
+        _print_table(report, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
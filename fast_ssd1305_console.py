@@ -0,0 +1,157 @@
+# Scrolling console for fast_ssd1305
+# Uses the 8 pages of GDDRAM as a ring buffer of text lines. Only part of the
+# ring is visible (4 pages on a 128x32 panel), so a new line is written into
+# the hidden page just below the visible ones and then brought into view by
+# moving the display start line. Appending a line costs one page write and
+# one command, whatever is already on screen.
+#
+# Usage: some_command | python fast_ssd1305_console.py --dc 24 [--rst 25]
+#
+
+import argparse
+import select
+import sys
+import time
+
+import fast_ssd1305
+
+
+class Console(object):
+    """Terminal-style text output on a display, scrolled by the hardware.
+
+    size is the font size (8 or 16). With smooth=True new lines scroll into
+    view one row at a time, interval seconds apart, otherwise they jump."""
+
+    def __init__(self, display, size=8, smooth=False, interval=.01):
+        self.display = display
+        self.size = size
+        self.smooth = smooth
+        self.interval = interval
+        self._atlas = fast_ssd1305._atlas(size)
+        self._line_pages = self._atlas.pages          # Pages per line of text
+        self._visible = display.height // 8           # Visible pages
+        self.clear()
+
+    def clear(self):
+        """Blank the display and start again at the top."""
+        self.display.clear()
+        self.display.vert_offset(0)
+        self._top = 0        # RAM page shown at the top of the display
+        self._lines = 0      # Lines written so far, until the screen is full
+
+    def wrap(self, text):
+        """Split text into lines that fit the display width, breaking at
+        spaces where possible."""
+        lines = []
+        for paragraph in text.split('\n'):
+            line, width = '', 0
+            for word in paragraph.split(' '):
+                word_width = sum(len(self._atlas.glyph(char)[0]) for char in word)
+                space = len(self._atlas.glyph(' ')[0]) if line else 0
+                if line and width + space + word_width > self.display.width:
+                    lines.append(line)
+                    line, width, space = '', 0, 0
+                while word_width > self.display.width:
+                    # Word too long for a line on its own, split it.
+                    cut, cut_width = 0, 0
+                    while cut < len(word):
+                        char_width = len(self._atlas.glyph(word[cut])[0])
+                        if cut_width + char_width > self.display.width - width - space:
+                            break
+                        cut, cut_width = cut + 1, cut_width + char_width
+                    cut = max(cut, 1)
+                    lines.append(line + ' ' * bool(space) + word[:cut])
+                    line, width, space = '', 0, 0
+                    word = word[cut:]
+                    word_width = sum(len(self._atlas.glyph(char)[0]) for char in word)
+                line += ' ' * bool(space) + word
+                width += space + word_width
+            lines.append(line)
+        return lines
+
+    def write(self, text):
+        """Write text, wrapping it to the display width."""
+        self.write_lines(self.wrap(text.rstrip('\n')))
+
+    def write_lines(self, lines):
+        """Append lines that already fit the display width. When there are
+        more than fit on the screen, only the last screenful is drawn."""
+        fit = self._visible // self._line_pages
+        if len(lines) > fit:
+            lines = lines[-fit:]
+        scroll = 0
+        for line in lines:
+            pages = self._atlas.render(line, self.display.width)
+            if self._lines < fit:
+                page = (self._top + self._lines * self._line_pages) % 8
+                self._lines += 1
+            else:
+                page = (self._top + self._visible + scroll // 8) % 8
+                scroll += 8 * self._line_pages
+            for i, data in enumerate(pages):
+                self.display._update(data[::-1], 0, self.display.width - 1, (page + i) % 8, (page + i) % 8)
+        if scroll:
+            self._scroll(scroll)
+
+    def _scroll(self, rows):
+        self._top = (self._top + rows // 8) % 8
+        if self.smooth:
+            for i in range(rows):
+                self.display.scroll_down(1)
+                time.sleep(self.interval)
+        else:
+            self.display.vert_offset(self._top * 8)
+
+    def tail(self, stream, follow=False, poll=.1):
+        """Copy lines from a file object (a log file, sys.stdin...) to the
+        display. Lines that arrive faster than they can be shown are written
+        in batches, skipping any that would scroll straight off again. With
+        follow=True, keep waiting for more at the end of the file."""
+        while True:
+            line = stream.readline()
+            if not line:
+                if not follow:
+                    return
+                time.sleep(poll)
+                continue
+            batch = self.wrap(line.rstrip('\n'))
+            while len(batch) < 64 and _ready(stream):
+                line = stream.readline()
+                if not line:
+                    break
+                batch += self.wrap(line.rstrip('\n'))
+            self.write_lines(batch)
+
+
+def _ready(stream):
+    # True if reading from stream won't block.
+    try:
+        return bool(select.select([stream], [], [], 0)[0])
+    except (ValueError, OSError, TypeError):
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show stdin or a file on an SSD1305 display.')
+    parser.add_argument('file', nargs='?', help='File to show (default stdin)')
+    parser.add_argument('-f', '--follow', action='store_true', help='Keep waiting for more lines')
+    parser.add_argument('--dc', type=int, help='DC pin (SPI)')
+    parser.add_argument('--rst', type=int, default=None, help='Reset pin')
+    parser.add_argument('--spi-port', type=int, default=0)
+    parser.add_argument('--spi-device', type=int, default=0)
+    parser.add_argument('--size', type=int, default=8, choices=(8, 16))
+    parser.add_argument('--smooth', action='store_true')
+    args = parser.parse_args(argv)
+    spi = fast_ssd1305.SPI.SpiDev(args.spi_port, args.spi_device, max_speed_hz=8000000)
+    display = fast_ssd1305.SSD1305_128_32(args.rst, dc=args.dc, spi=spi)
+    display.begin()
+    console = Console(display, args.size, args.smooth)
+    stream = open(args.file) if args.file else sys.stdin
+    try:
+        console.tail(stream, args.follow)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+# In-memory SSD1305 emulator
+# Stands in for the SPI, I2C and GPIO objects taken by fast_ssd1305, and
+# decodes the command/data stream the same way the controller does, so frame
+# throughput can be measured and checked without any hardware.
+#
+
+from PIL import Image
+
+from fast_ssd1305 import *
+
+# Number of argument bytes that follow each multi-byte command.
+_ARGS = {
+    SSD1305_MEMORYMODE: 1,
+    SSD1305_COLUMNADDR: 2,
+    SSD1305_PAGEADDR: 2,
+    SSD1305_SETCONTRAST: 1,
+    SSD1305_SETAREABRIGHTNESS: 1,
+    SSD1305_SETLUT: 4,
+    SSD1305_SETBANKCOLOURPAGE0: 4,
+    SSD1305_SETBANKCOLOURPAGE1: 4,
+    SSD1305_SETMULTIPLEX: 1,
+    SSD1305_DIMSETTING: 3,
+    SSD1305_CHARGEPUMP: 1,
+    SSD1305_SETDISPLAYOFFSET: 1,
+    SSD1305_SETDISPLAYCLOCKDIV: 1,
+    SSD1305_SETCOLOURLOWPOWER: 1,
+    SSD1305_SETPRECHARGE: 1,
+    SSD1305_SETCOMPINS: 1,
+    SSD1305_SETVCOMDETECT: 1,
+    SSD1305_RIGHT_HORIZONTAL_SCROLL: 4,
+    SSD1305_LEFT_HORIZONTAL_SCROLL: 4,
+    SSD1305_VERTICAL_AND_RIGHT_HORIZONTAL_SCROLL: 5,
+    SSD1305_VERTICAL_AND_LEFT_HORIZONTAL_SCROLL: 5,
+    SSD1305_SET_VERTICAL_SCROLL_AREA: 2,
+}
+
+
+class SSD1305Emulator(object):
+    """Virtual SSD1305 controller and panel.
+
+    Pass the same object as spi= and gpio= (with dc= matching the dc pin given
+    to the driver), or as i2c= and gpio=. As on the controller, the segment
+    remap is applied as data is written: column address c goes into RAM
+    column c with it normal (0xA0), or columns - 1 - c with it reversed
+    (0xA1), so changing it doesn't move what is already in RAM. The panel is
+    modelled as wired the way fast_ssd1305 expects: RAM column r is shown at
+    x = width - 1 - r, and with COM scan reversed (0xC8) RAM row start line
+    + y is shown at row y.
+    """
+
+    def __init__(self, width=128, height=32, dc=None, rst=None, columns=132):
+        self.width = width
+        self.height = height
+        self.columns = columns        # Columns of GDDRAM, 132 on the SSD1305
+        self._dc = dc
+        self._rst = rst
+        self._pins = {}
+        self.clock_hz = None
+        self.gddram = bytearray(columns * 8)
+        self.reset_counters()
+        self.reset()
+
+    def reset(self):
+        """Put the controller back into its power on state. GDDRAM is left
+        alone, as it is on the real thing."""
+        self.addressing = 2           # Page addressing mode
+        self.col_start, self.col_end = 0, self.columns - 1
+        self.page_start, self.page_end = 0, 7
+        self.col, self.page = 0, 0
+        self.start_line = 0
+        self.display_offset = 0
+        self.segment_remap = False
+        self.com_reverse = False
+        self.multiplex = 63
+        self.contrast = 0x80
+        self.inverted = False
+        self.all_on = False
+        self.display_on = False
+        self.scroll_setup = None      # (command, args) of last scroll setup
+        self.scroll_active = False
+        self.scroll_area = (0, 64)
+        self.registers = {}           # Last arguments of every other command
+        self._pending = []            # Command being collected, with args
+
+    def reset_counters(self):
+        """Zero the traffic counters."""
+        self.command_bytes = 0
+        self.data_bytes = 0
+        self.transactions = 0
+        self.dc_toggles = 0
+
+    @property
+    def bytes(self):
+        return self.command_bytes + self.data_bytes
+
+    # GPIO interface
+    def setup(self, pin, mode, pull_up_down=None):
+        self._pins.setdefault(pin, None)
+
+    def output(self, pin, value):
+        old = self._pins.get(pin)
+        value = bool(value)
+        self._pins[pin] = value
+        if pin == self._dc and old is not None and old != value:
+            self.dc_toggles += 1
+        if pin == self._rst and old and not value:
+            self.reset()
+
+    def set_high(self, pin):
+        self.output(pin, True)
+
+    def set_low(self, pin):
+        self.output(pin, False)
+
+    def input(self, pin):
+        return self._pins.get(pin)
+
+    # SPI interface
+    def set_clock_hz(self, hz):
+        self.clock_hz = hz
+
+    def set_mode(self, mode):
+        pass
+
+    def set_bit_order(self, order):
+        pass
+
+    def write(self, data, assert_ss=True, deassert_ss=True):
+        self.transactions += 1
+        if self._pins.get(self._dc):
+            self._data(data)
+        else:
+            self._commands(data)
+
+    # I2C interface
+    def get_i2c_device(self, address, **kwargs):
+        self.i2c_address = address
+        return self
+
+    def write8(self, register, value):
+        self.writeList(register, [value])
+
+    def writeList(self, register, data):
+        # Each chunk is a control byte then payload. With Co set, only one
+        # byte follows before the next control byte.
+        self.transactions += 1
+        data = [register] + list(data)
+        i = 0
+        while i < len(data) - 1:
+            control = data[i]
+            if control & 0x80:
+                payload, i = data[i + 1:i + 2], i + 2
+            else:
+                payload, i = data[i + 1:], len(data)
+            if control & 0x40:
+                self._data(payload)
+            else:
+                self._commands(payload)
+
+    # Controller
+    def _commands(self, seq):
+        for c in seq:
+            self.command_bytes += 1
+            if self._pending:
+                self._pending.append(c)
+            elif c in _ARGS:
+                self._pending = [c]
+            else:
+                self._execute(c, ())
+                continue
+            if len(self._pending) > _ARGS[self._pending[0]]:
+                cmd, args = self._pending[0], self._pending[1:]
+                self._pending = []
+                self._execute(cmd, args)
+
+    def _execute(self, c, args):
+        if c == SSD1305_MEMORYMODE:
+            self.addressing = args[0] & 0x03
+        elif c == SSD1305_COLUMNADDR:
+            self.col_start, self.col_end = args[0] % self.columns, args[1] % self.columns
+            self.col = self.col_start
+        elif c == SSD1305_PAGEADDR:
+            self.page_start, self.page_end = args[0] & 0x07, args[1] & 0x07
+            self.page = self.page_start
+        elif c < 0x10:
+            self.col = (self.col & 0xF0) | c
+        elif c < 0x20:
+            self.col = (self.col & 0x0F) | ((c & 0x0F) << 4)
+        elif 0x40 <= c < 0x80:
+            self.start_line = c & 0x3F
+        elif 0xB0 <= c < 0xB8:
+            self.page = c & 0x07
+        elif c in (SSD1305_SETHORIZONTALNORMAL, SSD1305_SETHORIZONTALREVERSE):
+            self.segment_remap = c == SSD1305_SETHORIZONTALREVERSE
+        elif c in (SSD1305_COMSCANINC, SSD1305_COMSCANDEC):
+            self.com_reverse = c == SSD1305_COMSCANDEC
+        elif c in (SSD1305_NORMALDISPLAY, SSD1305_INVERTDISPLAY):
+            self.inverted = c == SSD1305_INVERTDISPLAY
+        elif c in (SSD1305_DISPLAYALLON_RESUME, SSD1305_DISPLAYALLON):
+            self.all_on = c == SSD1305_DISPLAYALLON
+        elif c in (SSD1305_DISPLAYON, SSD1305_DISPLAYDIM):
+            self.display_on = True
+        elif c == SSD1305_DISPLAYOFF:
+            self.display_on = False
+        elif c == SSD1305_SETCONTRAST:
+            self.contrast = args[0]
+        elif c == SSD1305_SETMULTIPLEX:
+            self.multiplex = args[0] & 0x3F
+        elif c == SSD1305_SETDISPLAYOFFSET:
+            self.display_offset = args[0] & 0x3F
+        elif c == SSD1305_SET_VERTICAL_SCROLL_AREA:
+            self.scroll_area = (args[0], args[1])
+        elif c in (SSD1305_RIGHT_HORIZONTAL_SCROLL, SSD1305_LEFT_HORIZONTAL_SCROLL,
+                   SSD1305_VERTICAL_AND_RIGHT_HORIZONTAL_SCROLL,
+                   SSD1305_VERTICAL_AND_LEFT_HORIZONTAL_SCROLL):
+            self.scroll_setup = (c, tuple(args))
+        elif c == SSD1305_ACTIVATE_SCROLL:
+            self.scroll_active = self.scroll_setup is not None
+        elif c == SSD1305_DEACTIVATE_SCROLL:
+            self.scroll_active = False
+        else:
+            self.registers[c] = tuple(args)
+
+    def _data(self, buf):
+        ram = self.gddram
+        buf = bytearray(buf)
+        self.data_bytes += len(buf)
+        if self.addressing == 0 and self.col_start <= self.col <= self.col_end:
+            # Horizontal mode fills whole runs of a page at a time.
+            i = 0
+            while i < len(buf):
+                n = min(len(buf) - i, self.col_end + 1 - self.col)
+                offset = self.page * self.columns
+                if self.segment_remap:
+                    # Columns run backwards through RAM.
+                    end = offset + self.columns - self.col
+                    ram[end - n:end] = buf[i:i + n][::-1]
+                else:
+                    ram[offset + self.col:offset + self.col + n] = buf[i:i + n]
+                i += n
+                if self.col + n > self.col_end:
+                    self.col = self.col_start
+                    self.page = self.page_start if self.page >= self.page_end else self.page + 1
+                else:
+                    self.col += n
+            return
+        for b in buf:
+            column = self.columns - 1 - self.col if self.segment_remap else self.col
+            ram[self.page * self.columns + column] = b
+            if self.addressing == 0:     # Horizontal
+                if self.col >= self.col_end:
+                    self.col = self.col_start
+                    self.page = self.page_start if self.page >= self.page_end else self.page + 1
+                else:
+                    self.col += 1
+            elif self.addressing == 1:   # Vertical
+                if self.page >= self.page_end:
+                    self.page = self.page_start
+                    self.col = self.col_start if self.col >= self.col_end else self.col + 1
+                else:
+                    self.page += 1
+            else:                        # Page
+                self.col = (self.col + 1) % self.columns
+
+    def tick(self, steps=1):
+        """Advance an active hardware scroll by a number of steps, moving
+        GDDRAM contents (and the start line for vertical scrolls) the way the
+        controller would."""
+        if not self.scroll_active:
+            return
+        c, args = self.scroll_setup
+        offset, first, last = args[0], args[1] & 0x07, args[3] & 0x07
+        if c in (SSD1305_LEFT_HORIZONTAL_SCROLL, SSD1305_VERTICAL_AND_LEFT_HORIZONTAL_SCROLL):
+            offset = -offset
+        for _ in range(steps):
+            if offset:
+                for page in range(first, last + 1):
+                    row = self.gddram[page * self.columns:(page + 1) * self.columns]
+                    shift = offset % self.columns
+                    self.gddram[page * self.columns:(page + 1) * self.columns] = row[-shift:] + row[:-shift]
+            if len(args) > 4:
+                self.start_line = (self.start_line + args[4]) % 64
+
+    def pixel(self, column, row):
+        """Value of one GDDRAM bit."""
+        return (self.gddram[(row // 8) * self.columns + column] >> (row % 8)) & 1
+
+    def ram_image(self):
+        """All of GDDRAM as a mode '1' image, one pixel per RAM bit, RAM
+        column along x and RAM row along y."""
+        im = Image.new('1', (self.columns, 64))
+        px = im.load()
+        for row in range(64):
+            for column in range(self.columns):
+                if self.pixel(column, row):
+                    px[column, row] = 1
+        return im
+
+    def image(self):
+        """What the panel is showing, as a mode '1' image."""
+        im = Image.new('1', (self.width, self.height))
+        if not self.display_on:
+            return im
+        px = im.load()
+        rows = min(self.height, self.multiplex + 1)
+        for y in range(rows):
+            com = y if self.com_reverse else rows - 1 - y
+            row = (self.start_line + self.display_offset + com) % 64
+            for x in range(self.width):
+                column = self.width - 1 - x
+                on = self.all_on or self.pixel(column, row)
+                if on != self.inverted:
+                    px[x, y] = 1
+        return im
@@ -0,0 +1,176 @@
+# Greyscale for fast_ssd1305
+# The panel only shows on or off, so grey is made over time. An 'L' image is
+# quantized to a few levels and split into planes, plane k lighting every
+# pixel at level k or above, and the planes are shown in turn at a steady
+# rate. A pixel at level v is lit for v of every levels - 1 planes. Each plane
+# differs from the one before only where pixels sit at one level, and the
+# driver's shadow copy makes sure only those columns are sent.
+#
+# When a frame only uses one grey level nothing needs cycling: it is shown
+# as a plain 1 bit frame with the contrast turned down to match.
+#
+# Usage: python fast_ssd1305_grey.py image.png --dc 24 [--rst 25] [--levels 4]
+#
+
+import argparse
+import threading
+import time
+
+from PIL import Image
+
+import fast_ssd1305
+
+
+class GreyDisplay(object):
+    """Shows 'L' images on a display (already begun) in levels shades, 2 to
+    4, by cycling planes rate times a second. contrast is the display's
+    contrast at full brightness.
+
+    Set the picture with image(), then either call run() or start() the
+    cycling in a thread. plane_rate is the rate actually achieved, measured
+    over about the last second."""
+
+    def __init__(self, display, levels=4, rate=100, contrast=0x80):
+        if levels < 2 or levels > 4:
+            raise ValueError('Levels must be 2, 3 or 4')
+        self.display = display
+        self.levels = levels
+        self.rate = rate
+        self.contrast = contrast
+        self.plane_rate = 0.0
+        self.planes_shown = 0
+        self._planes = []
+        self._contrast = contrast
+        self._changed = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        # Tables for Image.point(): grey value to level, then one per plane.
+        self._level = [(v * (levels - 1) + 127) // 255 for v in range(256)]
+        self._tables = [[255 if level >= k else 0 for level in self._level]
+                        for k in range(1, levels)]
+
+    def image(self, image):
+        """Set the picture. Anything not in mode 'L' is converted."""
+        display = self.display
+        imwidth, imheight = image.size
+        if imwidth != display.width or imheight < display.height:
+            raise ValueError('Image must be same dimensions as display ({0}x{1}) (Larger Vertical Permitted).' \
+                .format(display.width, display.height))
+        if image.mode != 'L':
+            image = image.convert('L')
+        pages = display.height // 8
+        used = [level for level, count in enumerate(image.point(self._level).histogram()[:self.levels])
+                if count and level]
+        if len(used) <= 1:
+            # One grey level: a single plane, dimmed with the contrast.
+            level = used[0] if used else self.levels - 1
+            planes = [fast_ssd1305.pack_image(image.point(self._tables[0], '1'), pages)]
+            contrast = self.contrast * level // (self.levels - 1)
+        else:
+            planes = [fast_ssd1305.pack_image(image.point(table, '1'), pages) for table in self._tables]
+            contrast = self.contrast
+        with self._lock:
+            self._planes = planes
+            self._contrast = contrast
+            self._changed = True
+        if self._thread is None and not self._running:
+            # Nothing cycling, show the brightest plane so the frame is there.
+            self._show(planes[-1], contrast)
+
+    def _show(self, plane, contrast=None):
+        display = self.display
+        if contrast is not None:
+            display.set_contrast(contrast)
+        display._update(plane, 0, display.width - 1, 0, display.height // 8 - 1)
+
+    def run(self, seconds=None):
+        """Cycle the planes for seconds, or until stop(). Returns the average
+        plane rate achieved."""
+        self._running = True
+        period = 1.0 / self.rate
+        start = deadline = mark = time.monotonic()
+        shown = marked = 0
+        index = 0
+        try:
+            while self._running:
+                now = time.monotonic()
+                if seconds is not None and now - start >= seconds:
+                    break
+                with self._lock:
+                    planes, changed = self._planes, self._changed
+                    self._changed = False
+                if not planes:
+                    time.sleep(period)
+                    deadline = time.monotonic()
+                    continue
+                index = (index + 1) % len(planes)
+                self._show(planes[index], self._contrast if changed else None)
+                shown += 1
+                self.planes_shown += 1
+                deadline += period
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -period:
+                    # Fallen behind, don't try to catch up in a burst.
+                    deadline = time.monotonic()
+                now = time.monotonic()
+                if now - mark >= 1.0:
+                    self.plane_rate = (shown - marked) / (now - mark)
+                    mark, marked = now, shown
+        finally:
+            self._running = False
+        elapsed = time.monotonic() - start
+        return shown / elapsed if elapsed else 0.0
+
+    def start(self):
+        """Cycle the planes in a background thread."""
+        if self._thread is not None:
+            raise ValueError('Already running.')
+        self._running = True
+        self._thread = threading.Thread(target=self.run, name='fast_ssd1305 grey')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop cycling, leaving the brightest plane on the display at full
+        contrast."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            planes = self._planes
+        if planes:
+            self._show(planes[-1], self.contrast)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show a greyscale image on an SSD1305 display.')
+    parser.add_argument('image')
+    parser.add_argument('--dc', type=int, help='DC pin (SPI)')
+    parser.add_argument('--rst', type=int, default=None, help='Reset pin')
+    parser.add_argument('--spi-port', type=int, default=0)
+    parser.add_argument('--spi-device', type=int, default=0)
+    parser.add_argument('--levels', type=int, default=4, choices=(2, 3, 4))
+    parser.add_argument('--rate', type=float, default=100, help='Planes per second')
+    parser.add_argument('--seconds', type=float, default=None, help='Stop after this long')
+    args = parser.parse_args(argv)
+    spi = fast_ssd1305.SPI.SpiDev(args.spi_port, args.spi_device, max_speed_hz=8000000)
+    display = fast_ssd1305.SSD1305_128_32(args.rst, dc=args.dc, spi=spi)
+    display.begin()
+    display.clear()
+    grey = GreyDisplay(display, args.levels, args.rate)
+    image = Image.open(args.image).convert('L').resize((display.width, display.height))
+    grey.image(image)
+    try:
+        rate = grey.run(args.seconds)
+    except KeyboardInterrupt:
+        rate = grey.plane_rate
+    grey.stop()
+    print('{0:.1f} planes/s'.format(rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+# Widget layout for fast_ssd1305
+# Widgets own rectangles of the panel and only redraw when their value
+# changes. Layout pastes redrawn widgets into a frame image, then works out
+# which page/column windows to send: each dirty rectangle is rounded out to
+# whole pages, and rectangles are merged into their bounding box whenever
+# that costs fewer bytes on the bus than setting up separate windows.
+#
+
+from PIL import Image, ImageDraw
+
+import fast_ssd1305
+
+
+class Widget(object):
+    """Something drawn in the rectangle x, y, width, height of the panel.
+    Subclasses implement draw(draw, value) using a PIL ImageDraw on an
+    image of the widget's size."""
+
+    def __init__(self, x, y, width, height, value=None):
+        self.x, self.y = x, y
+        self.width, self.height = width, height
+        self.value = value
+        self.dirty = True
+
+    def set(self, value):
+        """Change the value, marking the widget for redrawing if it differs."""
+        if value != self.value:
+            self.value = value
+            self.dirty = True
+
+    def render(self):
+        image = Image.new('1', (self.width, self.height))
+        self.draw(ImageDraw.Draw(image), self.value)
+        return image
+
+    def draw(self, draw, value):
+        raise NotImplementedError
+
+
+class TextWidget(Widget):
+    """A line of text in one of the built in font sizes (8 or 16)."""
+
+    def __init__(self, x, y, width, height, size=8, value=''):
+        super(TextWidget, self).__init__(x, y, width, height, value)
+        self.font = fast_ssd1305._atlas(size).font
+
+    def draw(self, draw, value):
+        draw.text((0, 0), str(value), font=self.font, fill=255)
+
+
+class BarGauge(Widget):
+    """A horizontal bar filled in proportion to value between minimum and
+    maximum."""
+
+    def __init__(self, x, y, width, height, minimum=0, maximum=100, value=0, border=True):
+        super(BarGauge, self).__init__(x, y, width, height, value)
+        self.minimum, self.maximum = minimum, maximum
+        self.border = border
+
+    def set(self, value):
+        # Only redraw when the bar would actually change length.
+        if self._length(value) != self._length(self.value):
+            self.dirty = True
+        self.value = value
+
+    def _length(self, value):
+        inner = self.width - 2 if self.border else self.width
+        if value is None or self.maximum == self.minimum:
+            return 0
+        fraction = (value - self.minimum) / float(self.maximum - self.minimum)
+        return int(round(inner * min(1.0, max(0.0, fraction))))
+
+    def draw(self, draw, value):
+        edge = 0
+        if self.border:
+            draw.rectangle((0, 0, self.width - 1, self.height - 1), outline=255, fill=0)
+            edge = 1
+        length = self._length(value)
+        if length:
+            draw.rectangle((edge, edge, edge + length - 1, self.height - 1 - edge), outline=255, fill=255)
+
+
+class Sparkline(Widget):
+    """A line graph of the last width samples, scaled to fit. Add samples
+    with push()."""
+
+    def __init__(self, x, y, width, height):
+        super(Sparkline, self).__init__(x, y, width, height, ())
+
+    def push(self, sample):
+        self.set((self.value + (sample,))[-self.width:])
+
+    def draw(self, draw, value):
+        if not value:
+            return
+        low, high = min(value), max(value)
+        scale = (self.height - 1) / float(high - low) if high != low else 0
+        points = [(i, self.height - 1 - int(round((v - low) * scale))) for i, v in enumerate(value)]
+        if len(points) == 1:
+            draw.point(points, fill=255)
+        else:
+            draw.line(points, fill=255)
+
+
+class Icon(Widget):
+    """A mode '1' image, or one picked by name from a dict of images."""
+
+    def __init__(self, x, y, width, height, images=None, value=None):
+        super(Icon, self).__init__(x, y, width, height, value)
+        self.images = images or {}
+
+    def render(self):
+        image = self.value
+        if not isinstance(image, Image.Image):
+            image = self.images.get(image)
+        if image is None:
+            return Image.new('1', (self.width, self.height))
+        return image.convert('1').crop((0, 0, self.width, self.height))
+
+
+class Layout(object):
+    """A set of widgets on a display. Call update() to send whatever has
+    changed."""
+
+    def __init__(self, display):
+        self.display = display
+        self.widgets = []
+        self.frame = Image.new('1', (display.width, display.height))
+
+    def add(self, widget):
+        if (widget.x < 0 or widget.y < 0 or widget.x + widget.width > self.display.width
+                or widget.y + widget.height > self.display.height):
+            raise ValueError('Widget must be inside the display.')
+        self.widgets.append(widget)
+        widget.dirty = True
+        return widget
+
+    def update(self):
+        """Redraw changed widgets and send them. Returns the windows sent, as
+        (x0, page0, x1, page1) in image coordinates."""
+        rects = []
+        for widget in self.widgets:
+            if widget.dirty:
+                self.frame.paste(widget.render(), (widget.x, widget.y))
+                widget.dirty = False
+                rects.append((widget.x, widget.y // 8, widget.x + widget.width - 1,
+                              (widget.y + widget.height - 1) // 8))
+        windows = self._merge(rects)
+        width = self.display.width
+        for x0, page0, x1, page1 in windows:
+            pages = page1 + 1 - page0
+            buf = fast_ssd1305.pack_image(self.frame.crop((x0, page0 * 8, x1 + 1, (page1 + 1) * 8)), pages)
+            self.display._update(buf, width - 1 - x1, width - 1 - x0, page0, page1)
+        return windows
+
+    def _cost(self, rect):
+        x0, page0, x1, page1 = rect
+        return self.display._window_cost + (x1 + 1 - x0) * (page1 + 1 - page0)
+
+    def _merge(self, rects):
+        # Keep merging the pair of rectangles whose bounding box saves the
+        # most bytes over sending them apart, until no merge saves anything.
+        rects = list(rects)
+        while len(rects) > 1:
+            best = None
+            for i in range(len(rects)):
+                for j in range(i + 1, len(rects)):
+                    a, b = rects[i], rects[j]
+                    box = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    saving = self._cost(a) + self._cost(b) - self._cost(box)
+                    if saving >= 0 and (best is None or saving > best[0]):
+                        best = (saving, i, j, box)
+            if best is None:
+                break
+            saving, i, j, box = best
+            rects = [r for k, r in enumerate(rects) if k not in (i, j)] + [box]
+        return rects
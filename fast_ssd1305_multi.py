@@ -0,0 +1,192 @@
+# Several SSD1305 panels on shared SPI buses
+# DisplayManager owns the buses and hands each panel a stand-in SPI object
+# that selects the panel with its own CS line, so panels on one bus take
+# turns while separate buses run side by side in their own threads. The DC
+# line is driven by the stand-in too, inside the same turn, so panels can
+# share one DC pin. Updates are staged per panel and sent together by
+# update_all().
+#
+
+import concurrent.futures
+import threading
+import time
+
+import fast_ssd1305
+
+
+class _Bus(object):
+    # One shared SPI bus, with the lock that keeps its panels taking turns.
+    def __init__(self, spi, gpio, clock_hz):
+        self.spi = spi
+        self.gpio = gpio
+        self.clock_hz = None          # Clock the bus is running at now
+        self.default_hz = clock_hz
+        self.lock = threading.RLock()
+        self.panels = []
+        self.dc_levels = {}           # DC pin: level it was last driven to
+        self.bytes = 0
+        self.transactions = 0
+
+
+class _PanelSPI(object):
+    # What a panel sees as its SPI device. Each transfer holds the bus lock,
+    # sets the bus to this panel's clock and DC level and selects it with its
+    # CS line.
+    def __init__(self, bus, cs, dc=None):
+        self._bus = bus
+        self._cs = cs
+        self._dc = dc
+        self._level = None
+        self.clock_hz = bus.default_hz
+        if cs is not None:
+            bus.gpio.setup(cs, fast_ssd1305._GPIO_OUT)
+            bus.gpio.set_high(cs)
+
+    def set_clock_hz(self, hz):
+        # Only remembered here, the bus is switched when this panel uses it.
+        # A clock given to add_bus() wins over what the panel asks for.
+        self.clock_hz = self._bus.default_hz or hz
+
+    def set_dc(self, level):
+        # Stands in for the display's own _set_dc(). The level is only
+        # remembered here and put on the pin by write(), while it holds the
+        # bus, as another panel may be using the same pin in between.
+        self._level = level
+
+    def set_mode(self, mode):
+        with self._bus.lock:
+            self._bus.spi.set_mode(mode)
+
+    def set_bit_order(self, order):
+        with self._bus.lock:
+            self._bus.spi.set_bit_order(order)
+
+    def write(self, data):
+        bus = self._bus
+        with bus.lock:
+            if bus.clock_hz != self.clock_hz:
+                bus.spi.set_clock_hz(self.clock_hz)
+                bus.clock_hz = self.clock_hz
+            if self._dc is not None and bus.dc_levels.get(self._dc) != self._level:
+                if self._level:
+                    bus.gpio.set_high(self._dc)
+                else:
+                    bus.gpio.set_low(self._dc)
+                bus.dc_levels[self._dc] = self._level
+            if self._cs is not None:
+                bus.gpio.set_low(self._cs)
+            try:
+                bus.spi.write(data)
+            finally:
+                if self._cs is not None:
+                    bus.gpio.set_high(self._cs)
+            bus.bytes += len(data)
+            bus.transactions += 1
+
+
+class DisplayManager(object):
+    """Drives several panels on one or more SPI buses.
+
+    Add each bus with add_bus() and each panel with add_panel(), which
+    returns an ordinary display object. Stage updates with image(), page()
+    and window() (or call the display's own methods for immediate writes),
+    then send everything with update_all()."""
+
+    def __init__(self, gpio=None):
+        self._gpio = gpio
+        self._buses = []
+        self._pending = {}            # display: [_update() arguments, ...]
+        self._executor = None
+        self.stats = {'updates': 0, 'seconds': 0.0, 'bytes': 0, 'transactions': 0}
+
+    def add_bus(self, spi, gpio=None, clock_hz=8000000):
+        """Add an SPI bus. Returns a handle for add_panel()."""
+        gpio = gpio or self._gpio
+        if gpio is None:
+            gpio = self._gpio = fast_ssd1305.GPIO.get_platform_gpio()
+        bus = _Bus(spi, gpio, clock_hz)
+        self._buses.append(bus)
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        return bus
+
+    def add_panel(self, bus, dc, cs=None, rst=None, cls=None, **kwargs):
+        """Add a panel on bus, selected by GPIO cs (or None if it is the only
+        device on the bus's own chip select) with data/command line dc.
+        Returns the display, an instance of cls (SSD1305_128_32 by default)."""
+        cls = cls or fast_ssd1305.SSD1305_128_32
+        spi = _PanelSPI(bus, cs, dc)
+        display = cls(rst, dc=dc, gpio=bus.gpio, spi=spi, **kwargs)
+        display._set_dc = spi.set_dc
+        bus.panels.append(display)
+        return display
+
+    @property
+    def displays(self):
+        return [display for bus in self._buses for display in bus.panels]
+
+    def begin_all(self):
+        """Reset and initialize every panel, a bus at a time per thread."""
+        self._each_bus(lambda bus: [display.begin() for display in bus.panels])
+
+    def image(self, display, image):
+        """Stage a whole frame for display. It replaces anything already
+        staged for it."""
+        self._pending[display] = [display._pack_frame(image)]
+
+    def page(self, display, image, page):
+        self._pending.setdefault(display, []).append(display._pack_page(image, page))
+
+    def window(self, display, image, page, start, end):
+        self._pending.setdefault(display, []).append(display._pack_window(image, page, start, end))
+
+    def update_all(self):
+        """Send all staged updates, the buses in parallel. Returns timing
+        stats for this update; running totals are kept in self.stats."""
+        pending, self._pending = self._pending, {}
+        for bus in self._buses:
+            bus.bytes = bus.transactions = 0
+        start = time.perf_counter()
+        per_bus = self._each_bus(lambda bus: self._update_bus(bus, pending))
+        seconds = time.perf_counter() - start
+        stats = {
+            'seconds': seconds,
+            'panels': sum(len(updates) > 0 for updates in pending.values()),
+            'bytes': sum(bus.bytes for bus in self._buses),
+            'transactions': sum(bus.transactions for bus in self._buses),
+            'buses': per_bus,
+        }
+        self.stats['updates'] += 1
+        self.stats['seconds'] += seconds
+        self.stats['bytes'] += stats['bytes']
+        self.stats['transactions'] += stats['transactions']
+        return stats
+
+    def _update_bus(self, bus, pending):
+        # Send every staged update for the panels on one bus, holding the bus
+        # for the whole lot so nothing else gets in between.
+        start = time.perf_counter()
+        panels = 0
+        with bus.lock:
+            for display in bus.panels:
+                updates = pending.get(display)
+                if updates:
+                    panels += 1
+                    for args in updates:
+                        display._update(*args)
+        return {'seconds': time.perf_counter() - start, 'panels': panels,
+                'bytes': bus.bytes, 'transactions': bus.transactions}
+
+    def _each_bus(self, func):
+        # Run func(bus) for every bus, in parallel, and return the results.
+        if len(self._buses) == 1:
+            return [func(self._buses[0])]
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(self._buses))
+        return list(self._executor.map(func, self._buses))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,202 @@
+# Process pool rendering for fast_ssd1305
+# Drawing a rich frame with PIL and packing it keeps one core busy, and
+# threads can't spread that out because of the GIL. RenderPipeline runs the
+# drawing and packing in worker processes, which hand back just the packed
+# page bytes, while one writer thread in this process sends the frames to the
+# display strictly in order. At most depth frames are in flight at once.
+#
+# With a frame rate set, frame n is due at a fixed time after the first. A
+# frame that is ready later than that (plus some tolerance) is dropped if the
+# one after it is already waiting, so a slow bus catches up instead of
+# falling further behind. With nothing newer to show it is sent late rather
+# than leaving the display stuck. How late frames are is measured either way.
+#
+
+import collections
+import concurrent.futures
+import threading
+import time
+
+import fast_ssd1305
+
+_worker = {}
+
+
+def _init_worker(render, width, height, dither, threshold):
+    # Runs once in each worker process. Only the conversion settings of a
+    # display are needed here, so the display object is never initialized.
+    converter = object.__new__(fast_ssd1305.fast_ssd1305Base)
+    converter.set_dither(dither, threshold)
+    _worker.update(render=render, width=width, height=height, converter=converter)
+
+
+def _render_frame(args):
+    # Draw and pack one frame, returning the page bytes and how long it took.
+    start = time.perf_counter()
+    image = _worker['render'](*args)
+    if image.size[0] != _worker['width'] or image.size[1] < _worker['height']:
+        raise ValueError('Image must be same dimensions as display ({0}x{1}) (Larger Vertical Permitted).' \
+            .format(_worker['width'], _worker['height']))
+    buf = fast_ssd1305.pack_image(_worker['converter']._mono(image), _worker['height'] // 8)
+    return bytes(buf), time.perf_counter() - start
+
+
+class RenderPipeline(object):
+    """Renders frames in a pool of worker processes and shows them on
+    display in the order they were submitted.
+
+    render(*args) draws a frame and returns a PIL image the size of the
+    display, in any mode image() takes (converted with dither and
+    threshold, see set_dither()). It runs in another process, so it has to
+    be a module level function, and its arguments have to pickle.
+
+    With fps set, frames are shown at that rate, the first latency seconds
+    (depth frames' worth by default) after it is submitted. A frame that
+    isn't ready until more than tolerance seconds (half a frame by default)
+    after it is due is dropped if the next frame is ready too. Without fps,
+    frames are shown as soon as they are ready and never dropped."""
+
+    def __init__(self, display, render, workers=None, depth=4, fps=None, latency=None,
+                 tolerance=None, dither='bayer', threshold=128):
+        if depth < 1:
+            raise ValueError('Depth must be at least 1.')
+        self.display = display
+        self.depth = depth
+        self.period = 1.0 / fps if fps else None
+        self.latency = latency if latency is not None else depth * (self.period or 0)
+        self.tolerance = tolerance if tolerance is not None else (self.period or 0) / 2
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(render, display.width, display.height, dither, threshold))
+        self._queue = collections.deque()   # (sequence, deadline, future) in order
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._done = 0                      # Frames sent or dropped
+        self._start = None
+        self._running = True
+        self._error = None
+        self._stats = {'sent': 0, 'dropped': 0, 'render_seconds': 0.0,
+                      'lateness_total': 0.0, 'lateness_max': 0.0}
+        self._writer = threading.Thread(target=self._writer_loop, name='fast_ssd1305 pipeline')
+        self._writer.daemon = True
+        self._writer.start()
+
+    def submit(self, *args):
+        """Queue a frame to be drawn by render(*args). Blocks while depth
+        frames are already in flight. Returns the frame's sequence number."""
+        with self._cond:
+            self._check()
+            while self._submitted - self._done >= self.depth and self._error is None:
+                self._cond.wait()
+            self._check()
+            if self._start is None:
+                self._start = time.monotonic() + self.latency
+            sequence = self._submitted
+            deadline = self._start + sequence * self.period if self.period else None
+            self._queue.append((sequence, deadline, self._pool.submit(_render_frame, args)))
+            self._submitted += 1
+            self._cond.notify_all()
+        return sequence
+
+    def run(self, frames):
+        """Submit render arguments for each frame in turn (each a tuple, or a
+        single argument) and wait for them all. Returns stats()."""
+        for args in frames:
+            self.submit(*(args if isinstance(args, tuple) else (args,)))
+        self.flush()
+        return self.stats()
+
+    def flush(self, timeout=None):
+        """Wait until every frame submitted so far has been sent or dropped.
+        Returns False if the timeout ran out first."""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._done < self._submitted and self._error is None:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self._check()
+        return True
+
+    def stats(self):
+        """Frames sent and dropped, mean render time, and mean and worst
+        lateness (how long after its due time each frame was ready, or for
+        frames that were on time, sent)."""
+        with self._cond:
+            stats = dict(self._stats)
+        handled = stats['sent'] + stats['dropped']
+        stats['render_mean'] = stats['render_seconds'] / handled if handled else 0.0
+        stats['lateness_mean'] = stats['lateness_total'] / handled if handled else 0.0
+        return stats
+
+    def close(self, flush=True):
+        """Stop the pipeline, by default after showing what was submitted."""
+        if flush and self._writer is not None:
+            try:
+                self.flush()
+            finally:
+                self._stop()
+        else:
+            self._stop()
+
+    def _stop(self):
+        with self._cond:
+            self._running = False
+            for sequence, deadline, future in self._queue:
+                future.cancel()
+            self._cond.notify_all()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        self._pool.shutdown()
+
+    def _check(self):
+        # Pass on any error from the writer thread or a worker.
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _writer_loop(self):
+        display = self.display
+        pages = display.height // 8
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                sequence, deadline, future = self._queue[0]
+                following = self._queue[1][2] if len(self._queue) > 1 else None
+            try:
+                buf, seconds = future.result()
+                sent = True
+                lateness = 0.0
+                if deadline is not None:
+                    now = time.monotonic()
+                    if now > deadline + self.tolerance and following is not None and following.done():
+                        sent = False
+                        lateness = now - deadline
+                    else:
+                        if now < deadline:
+                            time.sleep(deadline - now)
+                        display._update(buf, 0, display.width - 1, 0, pages - 1)
+                        lateness = max(0.0, time.monotonic() - deadline)
+                else:
+                    display._update(buf, 0, display.width - 1, 0, pages - 1)
+            except Exception as e:
+                with self._cond:
+                    self._error = e
+                    self._queue.popleft()
+                    self._done += 1
+                    self._cond.notify_all()
+                continue
+            with self._cond:
+                self._queue.popleft()
+                self._done += 1
+                stats = self._stats
+                stats['sent' if sent else 'dropped'] += 1
+                stats['render_seconds'] += seconds
+                stats['lateness_total'] += lateness
+                stats['lateness_max'] = max(stats['lateness_max'], lateness)
+                self._cond.notify_all()
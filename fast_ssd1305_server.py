@@ -0,0 +1,353 @@
+# Display server for fast_ssd1305
+# One process owns the display and any number of local clients draw on it
+# through a UNIX socket. Each client gets its own layer: a memory mapped
+# framebuffer of page bytes that it fills in directly, so frames never travel
+# through the socket. The server stacks the layers by priority, each clipped
+# to its region, and the driver's shadow copy makes sure only what changed is
+# sent to the display.
+#
+# Protocol: one JSON object per line each way. Every request gets a reply,
+# {"ok": true, ...} or {"ok": false, "error": "..."}.
+#
+#   {"op": "hello", "priority": 0, "region": [x0, page0, x1, page1]}
+#       -> {"ok": true, "shm": path, "width": 128, "pages": 8}
+#   {"op": "frame"}                         whole layer changed
+#   {"op": "page", "page": n}               one page of the layer changed
+#   {"op": "window", "page": n, "start": x0, "end": x1}
+#   {"op": "text", "text": "...", "size": 8, "line": n}
+#   {"op": "clear"}
+#
+# Usage: python fast_ssd1305_server.py --socket PATH --dc 24 [--rst 25]
+#
+
+import argparse
+import errno
+import json
+import logging
+import mmap
+import os
+import selectors
+import socket
+import tempfile
+
+import fast_ssd1305
+
+DEFAULT_SOCKET = '/tmp/fast_ssd1305.sock'
+
+
+def _shm_dir():
+    # /dev/shm keeps the framebuffers in memory, fall back to temp files.
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def _check_page(page):
+    page = int(page)
+    if page < 0 or page > 7:
+        raise ValueError('Page must be 0-7')
+    return page
+
+
+def _check_window(start, end, width):
+    start, end = int(start), int(end)
+    if start < 0 or start >= width:
+        raise ValueError('Window Start must be 0-{0}'.format(width - 1))
+    if end < start or end >= width:
+        raise ValueError('Window End must be 0-{0} and >= Start'.format(width - 1))
+    return start, end
+
+
+class _Layer(object):
+    # One client's framebuffer, priority and region.
+    def __init__(self, number, size, priority, region):
+        self.number = number
+        self.priority = priority
+        self.region = region          # (col_start, col_end, page_start, page_end)
+        self.shown = False            # Hidden until the client first draws
+        fd, self.path = tempfile.mkstemp(prefix='fast_ssd1305_', dir=_shm_dir())
+        try:
+            os.ftruncate(fd, size)
+            self.buffer = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        self.buffer.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class DisplayServer(object):
+    """Owns a display (already begun) and draws client layers on it."""
+
+    def __init__(self, display, path=DEFAULT_SOCKET):
+        self._log = logging.getLogger('fast_1305.DisplayServer')
+        self.display = display
+        self.path = path
+        self._size = display.width * 8
+        self._frame = bytearray(self._size)
+        self._clients = {}            # socket: [layer, receive buffer]
+        self._next = 0
+        self._selector = selectors.DefaultSelector()
+        try:
+            os.unlink(path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(path)
+        self._socket.listen(8)
+        self._socket.setblocking(False)
+        self._selector.register(self._socket, selectors.EVENT_READ)
+        self._running = False
+
+    def serve_forever(self):
+        self._running = True
+        while self._running:
+            for key, events in self._selector.select(timeout=0.5):
+                if key.fileobj is self._socket:
+                    self._accept()
+                else:
+                    self._read(key.fileobj)
+
+    def shutdown(self):
+        self._running = False
+
+    def close(self):
+        for sock in list(self._clients):
+            self._drop(sock)
+        self._selector.close()
+        self._socket.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _accept(self):
+        sock, _ = self._socket.accept()
+        sock.setblocking(True)
+        self._clients[sock] = [None, b'']
+        self._selector.register(sock, selectors.EVENT_READ)
+
+    def _drop(self, sock):
+        layer = self._clients.pop(sock)[0]
+        self._selector.unregister(sock)
+        sock.close()
+        if layer is not None:
+            layer.close()
+            self._draw(layer.region)
+
+    def _read(self, sock):
+        try:
+            chunk = sock.recv(4096)
+        except OSError:
+            chunk = b''
+        if not chunk:
+            self._drop(sock)
+            return
+        client = self._clients[sock]
+        client[1] += chunk
+        while b'\n' in client[1]:
+            line, client[1] = client[1].split(b'\n', 1)
+            try:
+                reply = self._handle(client, json.loads(line.decode('utf-8')))
+                reply['ok'] = True
+            except Exception as e:
+                self._log.debug('Request failed: %s', e)
+                reply = {'ok': False, 'error': str(e)}
+            try:
+                sock.sendall(json.dumps(reply).encode('utf-8') + b'\n')
+            except OSError:
+                self._drop(sock)
+                return
+
+    def _handle(self, client, request):
+        op = request.get('op')
+        layer = client[0]
+        if op == 'hello':
+            if layer is not None:
+                raise ValueError('Already said hello.')
+            client[0] = layer = _Layer(self._next, self._size, request.get('priority', 0),
+                                       self._region(request.get('region')))
+            self._next += 1
+            return {'shm': layer.path, 'width': self.display.width, 'pages': 8}
+        if layer is None:
+            raise ValueError('Say hello first.')
+        first = not layer.shown
+        layer.shown = True
+        try:
+            area = self._apply(layer, op, request)
+        except Exception:
+            layer.shown = not first
+            raise
+        # The first time a layer draws, its whole region starts showing it.
+        self._draw(layer.region if first else area)
+        return {}
+
+    def _apply(self, layer, op, request):
+        # Carry out a drawing request, returning the area it changed.
+        width = self.display.width
+        if op == 'frame':
+            return layer.region
+        elif op == 'page':
+            page = _check_page(request['page'])
+            return (0, width - 1, page, page)
+        elif op == 'window':
+            page = _check_page(request['page'])
+            start, end = _check_window(request['start'], request['end'], width)
+            return (width - 1 - end, width - 1 - start, page, page)
+        elif op == 'text':
+            buf, col_start, col_end, page_start, page_end = self.display._pack_text(
+                request['text'], int(request.get('size', 8)), int(request.get('line', 0)))
+            layer.buffer[page_start * width:(page_end + 1) * width] = buf
+            return (col_start, col_end, page_start, page_end)
+        elif op == 'clear':
+            layer.buffer[:] = bytes(self._size)
+            return layer.region
+        raise ValueError('Unknown op {0!r}'.format(op))
+
+    def _region(self, region):
+        # Client regions are (x0, page0, x1, page1) in image coordinates.
+        width = self.display.width
+        if region is None:
+            return (0, width - 1, 0, 7)
+        x0, page0, x1, page1 = [int(v) for v in region]
+        if not (0 <= x0 <= x1 < width and 0 <= page0 <= page1 <= 7):
+            raise ValueError('Region must be inside the display.')
+        return (width - 1 - x1, width - 1 - x0, page0, page1)
+
+    def _draw(self, area):
+        # Rebuild the given area from the layers, lowest priority first, and
+        # send it. The driver only sends the bytes that actually changed.
+        col_start, col_end, page_start, page_end = area
+        width = self.display.width
+        layers = sorted((client[0] for client in self._clients.values()
+                         if client[0] is not None and client[0].shown),
+                        key=lambda layer: (layer.priority, layer.number))
+        for page in range(page_start, page_end + 1):
+            row = page * width
+            self._frame[row + col_start:row + col_end + 1] = bytes(col_end + 1 - col_start)
+            for layer in layers:
+                low = max(col_start, layer.region[0])
+                high = min(col_end, layer.region[1])
+                if low <= high and layer.region[2] <= page <= layer.region[3]:
+                    self._frame[row + low:row + high + 1] = layer.buffer[row + low:row + high + 1]
+        self.display._update(b''.join(self._frame[page * width + col_start:page * width + col_end + 1]
+                                      for page in range(page_start, page_end + 1)),
+                             col_start, col_end, page_start, page_end)
+
+
+class DisplayClient(object):
+    """Draws on a display owned by a DisplayServer. Higher priority layers
+    are drawn over lower ones, and a layer only shows inside its region,
+    given as (x0, page0, x1, page1)."""
+
+    def __init__(self, path=DEFAULT_SOCKET, priority=0, region=None):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(path)
+        self._file = self._socket.makefile('rb')
+        reply = self._request(op='hello', priority=priority, region=region)
+        self.width = reply['width']
+        self.pages = reply['pages']
+        fd = os.open(reply['shm'], os.O_RDWR)
+        try:
+            self.buffer = mmap.mmap(fd, self.width * self.pages)
+        finally:
+            os.close(fd)
+        # Converts images that aren't mode '1', as the display's image() would.
+        self._converter = object.__new__(fast_ssd1305.fast_ssd1305Base)
+        self._converter.set_dither()
+
+    def set_dither(self, method='bayer', threshold=128, cache_size=8):
+        """How images that aren't mode '1' are converted, as
+        fast_ssd1305Base.set_dither()."""
+        self._converter.set_dither(method, threshold, cache_size)
+
+    def _request(self, **request):
+        self._socket.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        reply = json.loads(self._file.readline().decode('utf-8'))
+        if not reply.get('ok'):
+            raise ValueError(reply.get('error'))
+        return reply
+
+    def image(self, image):
+        """Draw a whole image, as fast_ssd1305Base.image(). Pages below the
+        bottom of the image are left as they are."""
+        imwidth, imheight = image.size
+        if imwidth != self.width or imheight < 8:
+            raise ValueError('Image must be same width as display ({0}) and at least 8 high.' \
+                .format(self.width))
+        pages = min(imheight // 8, self.pages)
+        self.buffer[:self.width * pages] = fast_ssd1305.pack_image(self._converter._mono(image), pages)
+        self._request(op='frame')
+
+    def page(self, image, page):
+        page = _check_page(page)
+        imwidth, imheight = image.size
+        if imwidth != self.width or imheight < 8:
+            raise ValueError('Image must be same dimensions as page ({0}x{1}) (Larger Vertical Permitted).' \
+                .format(self.width, 8))
+        self.buffer[page * self.width:(page + 1) * self.width] = \
+            fast_ssd1305.pack_image(self._converter._mono(image), 1)
+        self._request(op='page', page=page)
+
+    def window(self, image, page, start, end):
+        page = _check_page(page)
+        start, end = _check_window(start, end, self.width)
+        imwidth, imheight = image.size
+        if imwidth != end + 1 - start or imheight < 8:
+            raise ValueError('Image must be same dimensions as window ({0}x{1}) (Larger Vertical Permitted).' \
+                .format(end + 1 - start, 8))
+        offset = page * self.width + self.width - 1 - end
+        self.buffer[offset:offset + end + 1 - start] = \
+            fast_ssd1305.pack_image(self._converter._mono(image, start), 1)
+        self._request(op='window', page=page, start=start, end=end)
+
+    def raw_frame(self, buf):
+        """Draw page bytes laid out as for fast_ssd1305Base.raw_frame()."""
+        buf = memoryview(buf).cast('B')
+        self.buffer[:len(buf)] = buf
+        self._request(op='frame')
+
+    def text(self, text, size, line):
+        self._request(op='text', text=text, size=size, line=line)
+
+    def clear(self):
+        self._request(op='clear')
+
+    def close(self):
+        self.buffer.close()
+        self._file.close()
+        self._socket.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve an SSD1305 display to local clients.')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET)
+    parser.add_argument('--dc', type=int, help='DC pin (SPI)')
+    parser.add_argument('--rst', type=int, default=None, help='Reset pin')
+    parser.add_argument('--spi-port', type=int, default=0)
+    parser.add_argument('--spi-device', type=int, default=0)
+    parser.add_argument('--i2c-bus', type=int, default=None, help='Use I2C on this bus instead of SPI')
+    args = parser.parse_args(argv)
+    if args.i2c_bus is not None:
+        display = fast_ssd1305.SSD1305_128_32(args.rst, i2c_bus=args.i2c_bus)
+    else:
+        spi = fast_ssd1305.SPI.SpiDev(args.spi_port, args.spi_device, max_speed_hz=8000000)
+        display = fast_ssd1305.SSD1305_128_32(args.rst, dc=args.dc, spi=spi)
+    display.begin()
+    display.clear()
+    server = DisplayServer(display, args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# Tests for the I2C transport, against a fake device that records each
+# block write. Run with: python -m unittest test_fast_ssd1305_i2c
+
+import unittest
+
+import fast_ssd1305
+
+
+class RecordingI2C(object):
+    """Stands in for the I2C provider, device and GPIO, keeping every
+    writeList() as a (control byte, data) transaction."""
+
+    def __init__(self):
+        self.transactions = []
+        self.fail_next_data = False
+
+    def get_i2c_device(self, address, **kwargs):
+        return self
+
+    def writeList(self, register, data):
+        if register == 0x40 and self.fail_next_data:
+            self.fail_next_data = False
+            raise IOError('Remote I/O error')
+        self.transactions.append((register, bytes(data)))
+
+    def setup(self, pin, mode, pull_up_down=None):
+        pass
+
+    def set_high(self, pin):
+        pass
+
+    def set_low(self, pin):
+        pass
+
+
+class I2CTransportTest(unittest.TestCase):
+
+    def make_display(self, **kwargs):
+        device = RecordingI2C()
+        display = fast_ssd1305.SSD1305_128_32(None, i2c=device, gpio=device, **kwargs)
+        return display, device
+
+    def test_commands_are_one_stream(self):
+        display, device = self.make_display()
+        display.begin()
+        self.assertEqual(len(device.transactions), 1)
+        control, data = device.transactions[0]
+        self.assertEqual(control, 0x00)
+        self.assertEqual(data[0], fast_ssd1305.SSD1305_DISPLAYOFF)
+        self.assertEqual(data[-1], fast_ssd1305.SSD1305_DISPLAYON)
+
+    def test_full_frame_is_chunked(self):
+        display, device = self.make_display()
+        frame = bytes(range(256)) * 2
+        display.raw_frame(frame)
+        commands = [data for control, data in device.transactions if control == 0x00]
+        chunks = [data for control, data in device.transactions if control == 0x40]
+        self.assertEqual(len(commands), 1)
+        self.assertEqual(len(chunks), 16)
+        self.assertEqual(len(device.transactions), 17)
+        self.assertTrue(all(len(chunk) == 32 for chunk in chunks))
+        self.assertEqual(b''.join(chunks), frame)
+        # Commands all come before the data they set up.
+        self.assertEqual(device.transactions[0][0], 0x00)
+
+    def test_custom_chunk_size(self):
+        display, device = self.make_display(i2c_chunk_size=100)
+        display.raw_frame(bytes(512))
+        chunks = [data for control, data in device.transactions if control == 0x40]
+        self.assertEqual([len(chunk) for chunk in chunks], [100] * 5 + [12])
+
+    def test_long_command_sequence_is_chunked(self):
+        display, device = self.make_display(i2c_chunk_size=16)
+        display.begin()
+        self.assertEqual([control for control, data in device.transactions], [0x00, 0x00])
+        self.assertEqual([len(data) for control, data in device.transactions], [16, 9])
+
+    def test_failed_write_is_sent_again(self):
+        display, device = self.make_display()
+        display.raw_frame(bytes(512))
+        device.transactions = []
+        device.fail_next_data = True
+        frame = bytes([0xFF]) * 512
+        self.assertRaises(IOError, display.raw_frame, frame)
+        display.raw_frame(frame)
+        chunks = [data for control, data in device.transactions if control == 0x40]
+        self.assertEqual(b''.join(chunks), frame)
+
+
+if __name__ == '__main__':
+    unittest.main()